@@ -0,0 +1,164 @@
+"""Batched generation of fixed-width bitvector values, backed by NumPy.
+
+NumPy is optional for pydrofoilhypothesis, the functions in this module
+raise ImportError if it is not installed.
+"""
+
+import collections.abc
+
+import _pydrofoil
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+from pydrofoilhypothesis.pydrofoilhypothesis import _bitvector, sailtype_kind
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ImportError("pydrofoilhypothesis.batch requires numpy")
+
+
+def _width(typ_or_width) -> int:
+    """Returns the width of a fixed-width bitvector type, or typ_or_width if it is an int."""
+    if isinstance(typ_or_width, int):
+        return typ_or_width
+    kind = sailtype_kind(typ_or_width)
+    assert kind in ("SmallFixedBitVector", "BigFixedBitVector"), (
+        "only fixed-width bitvector types can be batched"
+    )
+    return typ_or_width.width
+
+
+def _words(width: int) -> int:
+    """Returns the number of 64-bit words needed for a value of width bits."""
+    return max(1, (width + 63) // 64)
+
+
+def _mask_words(words, width: int):
+    """Clears the bits above width in the last column of a (count, words) uint64 array."""
+    top_bits = width - (words.shape[1] - 1) * 64
+    if top_bits < 64:
+        words[:, -1] &= numpy.uint64((1 << top_bits) - 1)
+    return words
+
+
+def random_words(typ_or_width, count: int, rng=None):
+    """Returns count random values as a (count, words) uint64 array, least significant word first.
+
+    Args:
+        typ_or_width: A SmallFixedBitVector or BigFixedBitVector type, or a width.
+        count (int): Number of values.
+        rng: A numpy.random.Generator or a seed, see numpy.random.default_rng.
+    """
+    _require_numpy()
+    width = _width(typ_or_width)
+    rng = numpy.random.default_rng(rng)
+    words = rng.integers(
+        0, 2 ** 64, size=(count, _words(width)), dtype=numpy.uint64, endpoint=False
+    )
+    return _mask_words(words, width)
+
+
+def words_from_bytes(typ_or_width, count: int, data: bytes):
+    """Interprets data as count little-endian values, returns them as a (count, words) uint64 array."""
+    _require_numpy()
+    width = _width(typ_or_width)
+    nwords = _words(width)
+    words = numpy.frombuffer(data, dtype="<u8", count=count * nwords)
+    return _mask_words(words.reshape(count, nwords).astype(numpy.uint64), width)
+
+
+class LazyBitvectors(collections.abc.Sequence):
+    """A sequence of bitvectors stored as a uint64 array, converted to bitvectors on access."""
+
+    def __init__(self, words, width: int):
+        self.words = words
+        self.width = width
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return LazyBitvectors(self.words[index], self.width)
+        return _bitvector_from_words(self.words[index], self.width)
+
+    def tolist(self) -> list:
+        """Converts all values to a list of bitvectors."""
+        return words_to_bitvectors(self.words, self.width)
+
+
+def _bitvector_from_words(row, width: int) -> _pydrofoil.bitvector:
+    if len(row) == 1:
+        return _pydrofoil.bitvector(width, int(row[0]))
+    return _bitvector(width, int.from_bytes(row.astype("<u8").tobytes(), "little"))
+
+
+def words_to_bitvectors(words, width: int) -> list:
+    """Converts a (count, words) uint64 array into a list of bitvectors of the given width."""
+    if words.shape[1] == 1:
+        bitvector = _pydrofoil.bitvector
+        return [bitvector(width, value) for value in words[:, 0].tolist()]
+    return [_bitvector_from_words(row, width) for row in words]
+
+
+def random_bitvectors(typ_or_width, count: int, rng=None, raw: bool = False):
+    """Returns count random bitvectors of a fixed width, generated from one NumPy random buffer.
+
+    Args:
+        typ_or_width: A SmallFixedBitVector or BigFixedBitVector type, or a width.
+        count (int): Number of values.
+        rng: A numpy.random.Generator or a seed, see numpy.random.default_rng.
+        raw (bool): Return a LazyBitvectors sequence backed by the uint64 array
+            instead of a list of bitvectors.
+    """
+    width = _width(typ_or_width)
+    words = random_words(width, count, rng)
+    if raw:
+        return LazyBitvectors(words, width)
+    return words_to_bitvectors(words, width)
+
+
+@st.composite
+def bitvector_batches(
+    draw: DrawFn, typ_or_width, count: int, raw: bool = False
+) -> list:
+    """Hypothesis strategy generating count bitvectors of a fixed width with a single draw.
+
+    Args:
+        typ_or_width: A SmallFixedBitVector or BigFixedBitVector type, or a width.
+        count (int): Number of values.
+        raw (bool): Generate LazyBitvectors sequences instead of lists of bitvectors.
+    """
+    width = _width(typ_or_width)
+    size = count * _words(width) * 8
+    words = words_from_bytes(width, count, draw(st.binary(min_size=size, max_size=size)))
+    if raw:
+        return LazyBitvectors(words, width)
+    return words_to_bitvectors(words, width)
+
+
+def register_batches(machine: _pydrofoil.RISCV64, names: list):
+    """Hypothesis strategy generating a dict of random values for the given bitvector registers.
+
+    Registers of the same width are drawn together, with one draw per
+    width, e.g. for the x or f register files.
+    """
+    register_types = dict(machine.register_info())
+    by_width = {}
+    for name in names:
+        by_width.setdefault(_width(register_types[name]), []).append(name)
+    return _draw_register_batches(list(by_width.items()))
+
+
+@st.composite
+def _draw_register_batches(draw: DrawFn, groups: list) -> dict:
+    values = {}
+    for width, names in groups:
+        values.update(zip(names, draw(bitvector_batches(width, len(names)))))
+    return values
@@ -0,0 +1,172 @@
+"""Benchmarks of strategy build time and draw throughput.
+
+Run ``python -m pydrofoilhypothesis.benchmark --output results.json`` and
+compare the JSON files of two runs to find regressions.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import _pydrofoil
+import hypothesis
+from hypothesis import given, settings, HealthCheck, Phase
+
+from pydrofoilhypothesis import pydrofoilhypothesis
+
+
+def benchmark_types(machine: _pydrofoil.RISCV64) -> list:
+    """Returns (name, typ) pairs covering every kind of sail type hypothesis_from_pydrofoil_type supports."""
+    registers = dict(machine.register_info())
+    lowlevel = machine.lowlevel
+    return [
+        ("SmallFixedBitVector", registers["x1"]),
+        ("BigFixedBitVector", lowlevel.wV.sail_type.arguments[1]),
+        ("FVec", registers["mhpmevent"]),
+        ("Vec", lowlevel.write_vmask.sail_type.arguments[2]),
+        ("Bool", lowlevel.bool_bit_backwards.sail_type.result),
+        ("MachineInt", lowlevel.wF.sail_type.arguments[0]),
+        ("Int", lowlevel.process_vm.sail_type.arguments[2]),
+        ("String", machine.types.exception.sail_type.constructors[1][1]),
+        ("Unit", lowlevel.wX.sail_type.result),
+        ("Enum", lowlevel.vitype_mnemonic_forwards.sail_type.arguments[0]),
+        ("Tuple", dict(machine.types.ast.sail_type.constructors)["ITYPE"]),
+        ("Struct", lowlevel.encdec_mul_op_backwards.sail_type.result),
+        ("Union ast", machine.types.ast.sail_type),
+        ("Union PTW_Result", machine.types.PTW_Result.sail_type),
+        (
+            "GenericBitVector",
+            getattr(lowlevel, "MemoryOpResult_add_meta<b>")
+            .sail_type.arguments[0]
+            .constructors[1][1],
+        ),
+    ]
+
+
+def time_build(machine: _pydrofoil.RISCV64, typ, repeat: int) -> float:
+    """Returns the fastest time in seconds to build the strategy of typ with a cold cache.
+
+    Everything cached for machine is dropped before every repetition.
+    """
+    timings = []
+    for i in range(repeat):
+        # constructor builders and default values are cached per machine too
+        pydrofoilhypothesis.clear_machine_cache(machine)
+        strategies = pydrofoilhypothesis.BasePydrofoilStrategies(machine)
+        start = time.perf_counter()
+        strategies.hypothesis_from_pydrofoil_type(typ)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def time_draws(strategy, examples: int) -> tuple:
+    """Draws up to examples values from strategy, returns (number of examples, seconds)."""
+    count = 0
+
+    @settings(
+        max_examples=examples,
+        database=None,
+        deadline=None,
+        phases=(Phase.generate,),
+        suppress_health_check=list(HealthCheck),
+    )
+    @given(strategy)
+    def run(value):
+        nonlocal count
+        count += 1
+
+    start = time.perf_counter()
+    run()
+    return count, time.perf_counter() - start
+
+
+def _result(name: str, examples: int, seconds: float, **extra) -> dict:
+    result = {"name": name}
+    result.update(extra)
+    result["examples"] = examples
+    result["seconds"] = seconds
+    result["examples_per_second"] = examples / seconds if seconds else None
+    return result
+
+
+def run_benchmarks(
+    machine: _pydrofoil.RISCV64, examples: int = 200, repeat: int = 3
+) -> dict:
+    """Runs all benchmarks against machine and returns the results as a JSON-compatible dict.
+
+    The caches of machine are cleared while the build times are measured.
+    """
+    results = []
+    for name, typ in benchmark_types(machine):
+        build_seconds = time_build(machine, typ, repeat)
+        strategy = pydrofoilhypothesis.BasePydrofoilStrategies(
+            machine
+        ).hypothesis_from_pydrofoil_type(typ)
+        count, seconds = time_draws(strategy, examples)
+        results.append(
+            _result(
+                name,
+                count,
+                seconds,
+                kind=pydrofoilhypothesis.sailtype_kind(typ),
+                build_seconds=build_seconds,
+            )
+        )
+
+    register_info = machine.register_info()
+    start = time.perf_counter()
+    strategy = pydrofoilhypothesis.RegisterPlan(machine, [], []).strategy
+    build_seconds = time.perf_counter() - start
+    count, seconds = time_draws(strategy, examples)
+    results.append(
+        _result("random_register_values", count, seconds, build_seconds=build_seconds)
+    )
+
+    timings = []
+    for i in range(repeat):
+        # default values are memoized per machine, measure computing them
+        pydrofoilhypothesis.clear_machine_cache(machine)
+        start = time.perf_counter()
+        for name, typ in register_info:
+            pydrofoilhypothesis.default_value(typ, machine)
+        timings.append(time.perf_counter() - start)
+    results.append(
+        _result("default_value register_info", len(register_info), min(timings))
+    )
+
+    return {
+        "python": platform.python_implementation() + " " + platform.python_version(),
+        "hypothesis": hypothesis.__version__,
+        "examples": examples,
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--examples", type=int, default=200, help="examples to draw per benchmark"
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="repetitions of the timing benchmarks"
+    )
+    parser.add_argument(
+        "--output", help="file to write the JSON results to, defaults to stdout"
+    )
+    args = parser.parse_args(argv)
+    machine = _pydrofoil.RISCV64()
+    results = run_benchmarks(machine, args.examples, args.repeat)
+    pydrofoilhypothesis.clear_machine_cache(machine)
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,610 @@
+"""A compact binary format for corpora of generated values, and a streaming reader.
+
+A corpus file starts with a header (magic and format version), followed by
+records. Every record is prefixed with its length, so the reader only keeps
+one record in memory at a time. The record kinds are:
+
+- TYPE: the JSON description (see typecache) of a type used by later records,
+- REGISTERS: the register names and types of later register-value records,
+- VALUE: a value of a type, e.g. an instruction,
+- REGISTER_VALUES: a dict of register values.
+
+Values are encoded using their type: bitvectors as their little-endian bytes,
+enums as the index of the element, unions as the index of the constructor
+followed by its argument, and so on. The reader rebuilds the values against
+a machine, without Hypothesis.
+"""
+
+import json
+import types
+
+import _pydrofoil
+
+from pydrofoilhypothesis import typecache
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    _bitvector,
+    constructor_builder,
+    sailtype_kind,
+    union_payload,
+)
+
+MAGIC = b"PDHC"
+FORMAT_VERSION = 1
+
+_TYPE = 1
+_REGISTERS = 2
+_VALUE = 3
+_REGISTER_VALUES = 4
+
+
+class CorpusFormatError(Exception):
+    """Raised for files that are not corpus files or have an unsupported version."""
+
+
+# _____________________________________________________________
+# varints
+
+
+def _write_varint(out: bytearray, value: int):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, pos: int) -> tuple:
+    result = 0
+    shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return result, pos
+        shift += 7
+
+
+def _write_signed(out: bytearray, value: int):
+    _write_varint(out, value * 2 if value >= 0 else -value * 2 - 1)
+
+
+def _read_signed(data, pos: int) -> tuple:
+    value, pos = _read_varint(data, pos)
+    return (value >> 1 if not value & 1 else -((value + 1) >> 1)), pos
+
+
+# _____________________________________________________________
+# union arguments
+
+
+class UnionArgumentsError(Exception):
+    """Raised when writing a union value whose arguments are unknown."""
+
+
+# pydrofoil has no documented way to get the arguments back out of a union
+# value. values built by pydrofoilhypothesis have their payload recorded (see
+# union_payload), for all others the user has to supply a function
+_union_argument_getter = None
+
+_MISSING = object()
+
+
+def register_union_argument_getter(getter):
+    """Sets the default function used by CorpusWriter to get the arguments of
+    union values that were not built by pydrofoilhypothesis.
+
+    Args:
+        getter: Callable (union value) returning the tuple of arguments the
+            constructor was called with, or None to remove the default.
+    """
+    global _union_argument_getter
+    _union_argument_getter = getter
+
+
+def _payload_from_arguments(value, typ, getter):
+    """Returns the value constructor_builder would build the union value from.
+
+    Args:
+        value: A value of a union constructor.
+        typ: The type of the constructor's argument.
+        getter: Callable (union value) returning the tuple of constructor arguments.
+    """
+    kind = sailtype_kind(typ)
+    if kind == "Unit":
+        return ()
+    if getter is None:
+        raise UnionArgumentsError(
+            f"can not write the {value.__class__.__name__} value {value!r}: it was "
+            "not built by pydrofoilhypothesis (or too long ago, see "
+            "UNION_PAYLOADS_MAXSIZE) and pydrofoil has no documented way to get "
+            "the arguments of union values, pass union_arguments to CorpusWriter "
+            "or call register_union_argument_getter"
+        )
+    arguments = tuple(getter(value))
+    if kind == "Tuple":
+        return arguments
+    if kind == "Struct" and len(typ.fields) > 1 and len(arguments) > 1:
+        # the constructor was called with the fields of the struct
+        return types.SimpleNamespace(
+            **{name: argument for ((name, fieldtyp), argument) in zip(typ.fields, arguments)}
+        )
+    assert len(arguments) == 1, f"{value!r} has {len(arguments)} arguments"
+    return arguments[0]
+
+
+# _____________________________________________________________
+# encoders: callables (value, out: bytearray)
+
+
+def _encoder_BitVector(writer, typ):
+    size = (typ.width + 7) // 8
+
+    def encode(value, out):
+        out += value.unsigned().to_bytes(size, "little")
+
+    return encode
+
+
+def _encode_GenericBitVector(value, out):
+    width = len(value)
+    _write_varint(out, width)
+    out += value.unsigned().to_bytes((width + 7) // 8, "little")
+
+
+def _encode_String(value, out):
+    data = value.encode("utf-8")
+    _write_varint(out, len(data))
+    out += data
+
+
+def _encoder_Enum(writer, typ):
+    indices = {element: index for (index, element) in enumerate(typ.elements)}
+
+    def encode(value, out):
+        _write_varint(out, indices[value])
+
+    return encode
+
+
+def _encoder_FVec(writer, typ):
+    encode_item = writer._encoder(typ.of)
+
+    def encode(value, out):
+        for item in value:
+            encode_item(item, out)
+
+    return encode
+
+
+def _encoder_Vec(writer, typ):
+    encode_item = writer._encoder(typ.of)
+
+    def encode(value, out):
+        _write_varint(out, len(value))
+        for item in value:
+            encode_item(item, out)
+
+    return encode
+
+
+def _encoder_Tuple(writer, typ):
+    encoders = [writer._encoder(elementtyp) for elementtyp in typ]
+
+    def encode(value, out):
+        for encode_item, item in zip(encoders, value):
+            encode_item(item, out)
+
+    return encode
+
+
+def _encoder_Struct(writer, typ):
+    if len(typ.fields) == 1:
+        return writer._encoder(typ.fields[0][1])
+    fields = [(name, writer._encoder(fieldtyp)) for (name, fieldtyp) in typ.fields]
+
+    def encode(value, out):
+        for name, encode_field in fields:
+            encode_field(getattr(value, name), out)
+
+    return encode
+
+
+def _encoder_Union(writer, typ):
+    machine = writer.machine
+    constructors = {}
+    for index, (name, constructortyp) in enumerate(typ.constructors):
+        constructors[name] = (index, constructortyp, None)
+
+    def encode(value, out):
+        name = value.__class__.__name__
+        index, constructortyp, encode_payload = constructors[name]
+        if encode_payload is None:
+            # constructors are encoded lazily, ast has hundreds of them
+            encode_payload = writer._encoder(constructortyp)
+            constructors[name] = (index, constructortyp, encode_payload)
+        payload = union_payload(machine, value, _MISSING)
+        if payload is _MISSING:
+            payload = _payload_from_arguments(value, constructortyp, writer.union_arguments)
+        _write_varint(out, index)
+        encode_payload(payload, out)
+
+    return encode
+
+
+def _write_signed_value(value, out):
+    _write_signed(out, value)
+
+
+_encoder_builders = {
+    "SmallFixedBitVector": _encoder_BitVector,
+    "BigFixedBitVector": _encoder_BitVector,
+    "GenericBitVector": lambda writer, typ: _encode_GenericBitVector,
+    "Bool": lambda writer, typ: lambda value, out: out.append(1 if value else 0),
+    "MachineInt": lambda writer, typ: _write_signed_value,
+    "Int": lambda writer, typ: _write_signed_value,
+    "String": lambda writer, typ: _encode_String,
+    "Enum": _encoder_Enum,
+    "Unit": lambda writer, typ: lambda value, out: None,
+    "FVec": _encoder_FVec,
+    "Vec": _encoder_Vec,
+    "Tuple": _encoder_Tuple,
+    "Struct": _encoder_Struct,
+    "Union": _encoder_Union,
+}
+
+
+# _____________________________________________________________
+# decoders: callables (data, pos) -> (value, pos)
+
+
+def _decoder_BitVector(reader, typ):
+    width = typ.width
+    size = (width + 7) // 8
+    from_bytes = int.from_bytes
+
+    def decode(data, pos):
+        end = pos + size
+        return _bitvector(width, from_bytes(data[pos:end], "little")), end
+
+    return decode
+
+
+def _decode_GenericBitVector(data, pos):
+    width, pos = _read_varint(data, pos)
+    end = pos + (width + 7) // 8
+    return _bitvector(width, int.from_bytes(data[pos:end], "little")), end
+
+
+def _decode_Bool(data, pos):
+    return data[pos] != 0, pos + 1
+
+
+def _decode_String(data, pos):
+    size, pos = _read_varint(data, pos)
+    return bytes(data[pos : pos + size]).decode("utf-8"), pos + size
+
+
+def _decoder_Enum(reader, typ):
+    elements = list(typ.elements)
+
+    def decode(data, pos):
+        index, pos = _read_varint(data, pos)
+        return elements[index], pos
+
+    return decode
+
+
+def _decoder_FVec(reader, typ):
+    decode_item = reader._decoder(typ.of)
+    length = typ.length
+
+    def decode(data, pos):
+        items = []
+        for _ in range(length):
+            item, pos = decode_item(data, pos)
+            items.append(item)
+        return items, pos
+
+    return decode
+
+
+def _decoder_Vec(reader, typ):
+    decode_item = reader._decoder(typ.of)
+
+    def decode(data, pos):
+        length, pos = _read_varint(data, pos)
+        items = []
+        for _ in range(length):
+            item, pos = decode_item(data, pos)
+            items.append(item)
+        return items, pos
+
+    return decode
+
+
+def _decoder_Tuple(reader, typ):
+    decoders = [reader._decoder(elementtyp) for elementtyp in typ]
+
+    def decode(data, pos):
+        items = []
+        for decode_item in decoders:
+            item, pos = decode_item(data, pos)
+            items.append(item)
+        return tuple(items), pos
+
+    return decode
+
+
+def _decoder_Struct(reader, typ):
+    if len(typ.fields) == 1:
+        return reader._decoder(typ.fields[0][1])
+    cls = getattr(reader.machine.types, typ.name)
+    decoders = [reader._decoder(fieldtyp) for (name, fieldtyp) in typ.fields]
+
+    def decode(data, pos):
+        values = []
+        for decode_field in decoders:
+            value, pos = decode_field(data, pos)
+            values.append(value)
+        return cls(*values), pos
+
+    return decode
+
+
+def _decoder_Union(reader, typ):
+    constructors = list(typ.constructors)
+    decoders = [None] * len(constructors)
+
+    def decode(data, pos):
+        index, pos = _read_varint(data, pos)
+        entry = decoders[index]
+        if entry is None:
+            name, constructortyp = constructors[index]
+            entry = decoders[index] = (
+                constructor_builder(reader.machine, name, constructortyp),
+                reader._decoder(constructortyp),
+            )
+        build, decode_payload = entry
+        payload, pos = decode_payload(data, pos)
+        return build(payload), pos
+
+    return decode
+
+
+_decoder_builders = {
+    "SmallFixedBitVector": _decoder_BitVector,
+    "BigFixedBitVector": _decoder_BitVector,
+    "GenericBitVector": lambda reader, typ: _decode_GenericBitVector,
+    "Bool": lambda reader, typ: _decode_Bool,
+    "MachineInt": lambda reader, typ: _read_signed,
+    "Int": lambda reader, typ: _read_signed,
+    "String": lambda reader, typ: _decode_String,
+    "Enum": _decoder_Enum,
+    "Unit": lambda reader, typ: lambda data, pos: ((), pos),
+    "FVec": _decoder_FVec,
+    "Vec": _decoder_Vec,
+    "Tuple": _decoder_Tuple,
+    "Struct": _decoder_Struct,
+    "Union": _decoder_Union,
+}
+
+
+# _____________________________________________________________
+
+
+class CorpusWriter:
+    """Writes values to a binary file object in the corpus format.
+
+    Usage::
+
+        with open("corpus.bin", "wb") as f:
+            writer = CorpusWriter(f, m)
+            writer.write(instruction, m.types.ast.sail_type)
+            writer.write_register_values(values)
+
+    Union values are written from the payload recorded when they were
+    generated (see union_payload). Writing union values built elsewhere
+    needs union_arguments, see register_union_argument_getter.
+    """
+
+    def __init__(self, file, machine: _pydrofoil.RISCV64, union_arguments=None):
+        """Write the header of the corpus.
+
+        Args:
+            file: The binary file object to write to.
+            machine: Instance of _pydrofoil.RISCV64()
+            union_arguments: Callable (union value) returning the tuple of arguments
+                the constructor was called with, for union values not built by
+                pydrofoilhypothesis. Defaults to the one set with
+                register_union_argument_getter.
+        """
+        if union_arguments is None:
+            union_arguments = _union_argument_getter
+        self.file = file
+        self.machine = machine
+        self.union_arguments = union_arguments
+        # the tables of enums, structs and unions written so far
+        self._description = {"enums": {}, "structs": {}, "unions": {}}
+        self._type_ids = {}
+        self._encoders = {}
+        self._register_sets = {}
+        self._register_types = None
+        file.write(MAGIC + bytes([FORMAT_VERSION]))
+
+    def _record(self, kind: int, payload):
+        header = bytearray()
+        _write_varint(header, len(payload) + 1)
+        header.append(kind)
+        self.file.write(header)
+        self.file.write(payload)
+
+    def _type_id(self, typ) -> int:
+        try:
+            return self._type_ids[typ]
+        except KeyError:
+            pass
+        before = {table: set(entries) for (table, entries) in self._description.items()}
+        description = typecache._describe_type(typ, self._description)
+        new_tables = {
+            table: {
+                name: entries[name] for name in entries if name not in before[table]
+            }
+            for (table, entries) in self._description.items()
+        }
+        type_id = self._type_ids[typ] = len(self._type_ids)
+        self._record(
+            _TYPE, json.dumps({"type": description, "tables": new_tables}).encode("utf-8")
+        )
+        return type_id
+
+    def _encoder(self, typ):
+        try:
+            return self._encoders[typ]
+        except KeyError:
+            pass
+        builder = _encoder_builders.get(sailtype_kind(typ))
+        assert builder is not None, "not implemented yet"
+        encoder = self._encoders[typ] = builder(self, typ)
+        return encoder
+
+    def write(self, value, typ):
+        """Writes a value of the pydrofoil type typ."""
+        type_id = self._type_id(typ)
+        out = bytearray()
+        _write_varint(out, type_id)
+        self._encoder(typ)(value, out)
+        self._record(_VALUE, out)
+
+    def write_register_values(self, values: dict):
+        """Writes a dict mapping register names to values, e.g. drawn from random_register_values."""
+        names = tuple(values)
+        register_set = self._register_sets.get(names)
+        if register_set is None:
+            if self._register_types is None:
+                self._register_types = dict(self.machine.register_info())
+            typs = [self._register_types[name] for name in names]
+            entries = [[name, self._type_id(typ)] for (name, typ) in zip(names, typs)]
+            register_set = self._register_sets[names] = (
+                len(self._register_sets),
+                [self._encoder(typ) for typ in typs],
+            )
+            self._record(_REGISTERS, json.dumps(entries).encode("utf-8"))
+        set_id, encoders = register_set
+        out = bytearray()
+        _write_varint(out, set_id)
+        for encode, value in zip(encoders, values.values()):
+            encode(value, out)
+        self._record(_REGISTER_VALUES, out)
+
+
+class CorpusReader:
+    """Reads the values of a corpus file object, rebuilding them against machine.
+
+    Iterating over the reader yields the values in the order they were
+    written, register-value records as dicts.
+    """
+
+    def __init__(self, file, machine: _pydrofoil.RISCV64):
+        self.file = file
+        self.machine = machine
+        header = file.read(len(MAGIC) + 1)
+        if header[: len(MAGIC)] != MAGIC:
+            raise CorpusFormatError("not a pydrofoilhypothesis corpus file")
+        if header[len(MAGIC)] != FORMAT_VERSION:
+            raise CorpusFormatError(f"unsupported corpus format version {header[len(MAGIC)]}")
+        self.types = typecache.MachineTypes(
+            {"enums": {}, "structs": {}, "unions": {}, "registers": [], "types": {}, "functions": {}}
+        )
+        self._typs = []
+        self._decoders = {}
+        self._register_sets = []
+
+    def _decoder(self, typ):
+        try:
+            return self._decoders[typ]
+        except KeyError:
+            pass
+        builder = _decoder_builders.get(sailtype_kind(typ))
+        assert builder is not None, "not implemented yet"
+        decoder = self._decoders[typ] = builder(self, typ)
+        return decoder
+
+    def _read_record(self):
+        """Returns (kind, payload) of the next record, or None at the end of the file."""
+        header = bytearray()
+        while True:
+            byte = self.file.read(1)
+            if not byte:
+                if header:
+                    raise CorpusFormatError("truncated record")
+                return None
+            header += byte
+            if byte[0] < 0x80:
+                break
+        size, _ = _read_varint(header, 0)
+        record = self.file.read(size)
+        if len(record) != size:
+            raise CorpusFormatError("truncated record")
+        return record[0], memoryview(record)[1:]
+
+    def __iter__(self):
+        while True:
+            record = self._read_record()
+            if record is None:
+                return
+            kind, payload = record
+            if kind == _TYPE:
+                data = json.loads(bytes(payload))
+                for table, entries in data["tables"].items():
+                    self.types.description[table].update(entries)
+                self._typs.append(self.types.type(data["type"]))
+            elif kind == _REGISTERS:
+                entries = json.loads(bytes(payload))
+                self._register_sets.append(
+                    [(name, self._decoder(self._typs[type_id])) for (name, type_id) in entries]
+                )
+            elif kind == _VALUE:
+                type_id, pos = _read_varint(payload, 0)
+                value, pos = self._decoder(self._typs[type_id])(payload, pos)
+                yield value
+            elif kind == _REGISTER_VALUES:
+                set_id, pos = _read_varint(payload, 0)
+                values = {}
+                for name, decode in self._register_sets[set_id]:
+                    values[name], pos = decode(payload, pos)
+                yield values
+            else:
+                raise CorpusFormatError(f"unknown record kind {kind}")
+
+
+def write_corpus(
+    path: str, machine: _pydrofoil.RISCV64, values, typ=None, union_arguments=None
+) -> int:
+    """Writes values to a new corpus file.
+
+    Args:
+        path (str): The file name.
+        machine: Instance of _pydrofoil.RISCV64()
+        values: Iterable of values of typ, or of register-value dicts if typ is None.
+        typ: The pydrofoil type of the values.
+        union_arguments: Callable (union value) returning the constructor arguments, see CorpusWriter.
+
+    Returns:
+        int: The number of written values.
+    """
+    count = 0
+    with open(path, "wb") as f:
+        writer = CorpusWriter(f, machine, union_arguments)
+        for value in values:
+            if typ is None:
+                writer.write_register_values(value)
+            else:
+                writer.write(value, typ)
+            count += 1
+    return count
+
+
+def read_corpus(path: str, machine: _pydrofoil.RISCV64):
+    """Yields the values of a corpus file, see CorpusReader."""
+    with open(path, "rb") as f:
+        yield from CorpusReader(f, machine)
@@ -0,0 +1,235 @@
+"""Strategies for valid instruction encodings, decoded with encdec_backwards.
+
+Random ast values are often ILLEGAL or reserved instructions. The strategies
+here generate encodings instead: an opcode, a key (the funct fields that
+select the instruction) and the remaining bits. Which keys are valid for an
+opcode is learned once per machine by decoding a few samples per key. A
+drawn encoding that still decodes to an illegal instruction is redirected
+to a known valid encoding with the same opcode and key, so no example is
+ever filtered out.
+"""
+
+import random
+
+import _pydrofoil
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+from pydrofoilhypothesis.pydrofoilhypothesis import _machine_cache
+
+
+def _deposit(value: int, mask: int) -> int:
+    """Distributes the low bits of value to the set bits of mask (like the pdep instruction)."""
+    result = 0
+    bit = 1
+    while mask:
+        lowest = mask & -mask
+        if value & bit:
+            result |= lowest
+        mask ^= lowest
+        bit <<= 1
+    return result
+
+
+class EncodingFormat:
+    """Describes the bit layout of a family of instruction encodings.
+
+    Attributes:
+        name (str): Name of the format.
+        width (int): Width of the encodings in bits.
+        decoder (str): Name of the lowlevel function decoding them.
+        encoder (str): Name of the lowlevel function encoding them.
+        opcodes (list[int]): The possible values of the opcode bits.
+        key_mask (int): The bits selecting the instruction within an opcode.
+        illegal (tuple[str]): Names of the constructors of illegal instructions.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        width: int,
+        decoder: str,
+        encoder: str,
+        opcode_mask: int,
+        opcodes: list,
+        key_mask: int,
+        illegal: tuple,
+    ):
+        assert not opcode_mask & key_mask
+        self.name = name
+        self.width = width
+        self.decoder = decoder
+        self.encoder = encoder
+        self.opcode_mask = opcode_mask
+        self.opcodes = list(opcodes)
+        self.key_mask = key_mask
+        self.free_mask = (2 ** width - 1) & ~(opcode_mask | key_mask)
+        self.key_count = 2 ** bin(key_mask).count("1")
+        self.illegal = illegal
+
+
+# 32-bit encodings: opcode in bits 6..0 (with bits 1..0 set), funct3 in
+# bits 14..12 and funct7 in bits 31..25
+RV32 = EncodingFormat(
+    "RV32",
+    32,
+    "encdec_backwards",
+    "encdec_forwards",
+    opcode_mask=0x7F,
+    opcodes=[opcode for opcode in range(128) if opcode & 3 == 3],
+    key_mask=(0x7 << 12) | (0x7F << 25),
+    illegal=("ILLEGAL",),
+)
+
+# 16-bit compressed encodings: quadrant in bits 1..0, funct3 in bits 15..13
+# and the bits 12..10 that some quadrants use to select the instruction
+RVC = EncodingFormat(
+    "RVC",
+    16,
+    "encdec_compressed_backwards",
+    "encdec_compressed_forwards",
+    opcode_mask=0x3,
+    opcodes=[0, 1, 2],
+    key_mask=(0x7 << 13) | (0x7 << 10),
+    illegal=("C_ILLEGAL", "ILLEGAL"),
+)
+
+
+class ValidPatterns:
+    """The valid keys of every opcode of an encoding format, learned lazily per opcode."""
+
+    def __init__(self, machine: _pydrofoil.RISCV64, fmt: EncodingFormat, samples: int = 4, seed: int = 0):
+        """Initialize the patterns.
+
+        Args:
+            machine: The pydrofoil machine.
+            fmt: The encoding format.
+            samples (int): Number of random encodings decoded per key while learning.
+            seed: Seed for the sampled encodings.
+        """
+        self.machine = machine
+        self.format = fmt
+        self.samples = samples
+        self._decode = getattr(machine.lowlevel, fmt.decoder)
+        self._random = random.Random(seed)
+        # opcode -> list of (key, valid example encoding)
+        self._keys = {}
+
+    def is_valid(self, instruction) -> bool:
+        """Returns whether instruction is not one of the illegal instructions of the format."""
+        return instruction.__class__.__name__ not in self.format.illegal
+
+    def decode(self, encoding: int):
+        """Decodes an encoding given as int."""
+        return self._decode(_pydrofoil.bitvector(self.format.width, encoding))
+
+    def keys(self, opcode: int) -> list:
+        """Returns the valid (key, example encoding) pairs of opcode."""
+        try:
+            return self._keys[opcode]
+        except KeyError:
+            pass
+        fmt = self.format
+        keys = []
+        for index in range(fmt.key_count):
+            key = _deposit(index, fmt.key_mask)
+            for _ in range(self.samples):
+                free = self._random.getrandbits(fmt.width) & fmt.free_mask
+                encoding = opcode | key | free
+                if self.is_valid(self.decode(encoding)):
+                    keys.append((key, encoding))
+                    break
+        self._keys[opcode] = keys
+        return keys
+
+
+def valid_patterns(machine: _pydrofoil.RISCV64, fmt: EncodingFormat = RV32) -> ValidPatterns:
+    """Returns the (cached) ValidPatterns of machine for fmt."""
+    cache = _machine_cache(machine)
+    patterns = cache.get("valid_patterns")
+    if patterns is None:
+        patterns = cache["valid_patterns"] = {}
+    try:
+        return patterns[fmt.name]
+    except KeyError:
+        result = patterns[fmt.name] = ValidPatterns(machine, fmt)
+        return result
+
+
+def _formats(machine: _pydrofoil.RISCV64, compressed) -> list:
+    """Returns the formats to generate, compressed=None means if the machine can decode them."""
+    formats = [RV32]
+    if compressed is None:
+        compressed = hasattr(machine.lowlevel, RVC.decoder)
+    if compressed:
+        formats.append(RVC)
+    return formats
+
+
+def valid_encodings(machine: _pydrofoil.RISCV64, compressed: bool = None):
+    """Hypothesis strategy generating (encoding, instruction) pairs of valid instructions.
+
+    The encoding is a bitvector of 32 (or 16 for compressed instructions)
+    bits, the instruction is the ast value it decodes to.
+
+    Args:
+        machine: Instance of _pydrofoil.RISCV64()
+        compressed (bool): Also generate 16-bit compressed encodings, defaults to
+            whether the machine has encdec_compressed_backwards.
+    """
+    patterns = [valid_patterns(machine, fmt) for fmt in _formats(machine, compressed)]
+    return _gen_valid_encoding(patterns)
+
+
+def valid_instructions(machine: _pydrofoil.RISCV64, compressed: bool = None):
+    """Hypothesis strategy generating valid instructions (ast values), see valid_encodings."""
+    return valid_encodings(machine, compressed).map(lambda pair: pair[1])
+
+
+@st.composite
+def _gen_valid_encoding(draw: DrawFn, patterns: list) -> tuple:
+    pattern = patterns[draw(st.integers(0, len(patterns) - 1))]
+    fmt = pattern.format
+    # redirect opcodes without valid instructions to the next opcode with
+    # some, so that nothing is filtered out
+    start = draw(st.integers(0, len(fmt.opcodes) - 1))
+    for offset in range(len(fmt.opcodes)):
+        opcode = fmt.opcodes[(start + offset) % len(fmt.opcodes)]
+        keys = pattern.keys(opcode)
+        if keys:
+            break
+    else:
+        raise ValueError(f"no valid {fmt.name} encodings found")
+    key, example = keys[draw(st.integers(0, len(keys) - 1))]
+    free = draw(st.integers(0, 2 ** fmt.width - 1)) & fmt.free_mask
+    encoding = opcode | key | free
+    instruction = pattern.decode(encoding)
+    if not pattern.is_valid(instruction):
+        encoding = example
+        instruction = pattern.decode(encoding)
+    return _pydrofoil.bitvector(fmt.width, encoding), instruction
+
+
+def check_roundtrip(machine: _pydrofoil.RISCV64, encoding, strict: bool = False):
+    """Checks that encoding the instruction decoded from encoding gives back the instruction.
+
+    Args:
+        machine: Instance of _pydrofoil.RISCV64()
+        encoding: A bitvector of 32 or 16 (compressed) bits.
+        strict (bool): Also check that the encoding itself is reproduced, which
+            fails for encodings with bits the decoder ignores.
+
+    Returns:
+        The re-encoded bitvector.
+    """
+    fmt = RVC if len(encoding) == RVC.width else RV32
+    decode = getattr(machine.lowlevel, fmt.decoder)
+    encode = getattr(machine.lowlevel, fmt.encoder)
+    instruction = decode(encoding)
+    reencoded = encode(instruction)
+    assert decode(reencoded) == instruction, (
+        f"{encoding!r} decodes to {instruction!r}, which encodes to {reencoded!r}"
+    )
+    if strict:
+        assert reencoded == encoding, f"{encoding!r} is re-encoded as {reencoded!r}"
+    return reencoded
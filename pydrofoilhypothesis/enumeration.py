@@ -0,0 +1,278 @@
+"""Exhaustive enumeration of the values of sail types with small domains.
+
+Every bounded type (bitvectors, bools, enums and tuples, structs, fixed-size
+vectors and unions of bounded types) has a Domain: a numbered sequence of
+all its values. Values are computed from their index, so domains are never
+materialized, and any contiguous range of indices (a shard) can be
+enumerated on its own.
+"""
+
+import bisect
+import itertools
+
+import _pydrofoil
+
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    _bitvector,
+    _machine_cache,
+    constructor_builder,
+    sailtype_kind,
+)
+
+DEFAULT_BUDGET = 2 ** 28
+
+# product domains whose factors all have at most this many values are
+# enumerated with itertools.product over the materialized factors
+MAX_MATERIALIZED_SIZE = 2 ** 16
+
+
+class Domain:
+    """The values of a bounded type, numbered from 0 to size - 1."""
+
+    size = 0
+
+    def value(self, index: int):
+        """Returns the value with the given index."""
+        raise NotImplementedError
+
+    def values(self, start: int = 0, stop: int = None):
+        """Yields the values with indices from start to stop (exclusive, defaults to size)."""
+        if stop is None:
+            stop = self.size
+        value = self.value
+        for index in range(start, stop):
+            yield value(index)
+
+    def __iter__(self):
+        return self.values()
+
+
+class _BitVectorDomain(Domain):
+    def __init__(self, width: int):
+        self.width = width
+        self.size = 2 ** width
+
+    def value(self, index: int):
+        return _bitvector(self.width, index)
+
+
+class _ElementsDomain(Domain):
+    def __init__(self, elements: list):
+        self.elements = list(elements)
+        self.size = len(self.elements)
+
+    def value(self, index: int):
+        return self.elements[index]
+
+
+class _ProductDomain(Domain):
+    """The cartesian product of domains, the last domain varies fastest."""
+
+    def __init__(self, domains: list, build):
+        self.domains = list(domains)
+        self.build = build
+        self.size = 1
+        for domain in self.domains:
+            self.size *= domain.size
+        self._factors = None
+
+    def value(self, index: int):
+        values = []
+        for domain in reversed(self.domains):
+            index, element_index = divmod(index, domain.size)
+            values.append(domain.value(element_index))
+        values.reverse()
+        return self.build(values)
+
+    def values(self, start: int = 0, stop: int = None):
+        if stop is None:
+            stop = self.size
+        if any(domain.size > MAX_MATERIALIZED_SIZE for domain in self.domains):
+            return Domain.values(self, start, stop)
+        if self._factors is None:
+            self._factors = [list(domain.values()) for domain in self.domains]
+        products = itertools.islice(self._products_from(start), max(0, stop - start))
+        if self.build is tuple:
+            return products
+        return map(self.build, products)
+
+    def _products_from(self, start: int):
+        """Returns an iterator of the tuples of itertools.product(*factors), starting at index start."""
+        factors = self._factors
+        if start >= self.size:
+            return iter(())
+        if not factors:
+            return itertools.product()
+        # the mixed-radix digits of start, the last factor varies fastest
+        digits = []
+        index = start
+        for factor in reversed(factors):
+            index, digit = divmod(index, len(factor))
+            digits.append(digit)
+        digits.reverse()
+        prefix = [[factor[digit]] for (factor, digit) in zip(factors, digits)]
+        # the rest of the innermost row, then for every outer position the
+        # rows after the one containing start
+        last = len(factors) - 1
+        parts = [itertools.product(*prefix[:last], factors[last][digits[last]:])]
+        for position in range(last - 1, -1, -1):
+            parts.append(
+                itertools.product(
+                    *prefix[:position],
+                    factors[position][digits[position] + 1 :],
+                    *factors[position + 1 :],
+                )
+            )
+        return itertools.chain.from_iterable(parts)
+
+
+class _UnionDomain(Domain):
+    """The disjoint union of the domains of the constructors of a union."""
+
+    def __init__(self, builders: list, domains: list):
+        self.builders = builders
+        self.domains = domains
+        self.offsets = []
+        self.size = 0
+        for domain in domains:
+            self.offsets.append(self.size)
+            self.size += domain.size
+
+    def value(self, index: int):
+        position = bisect.bisect_right(self.offsets, index) - 1
+        return self.builders[position](
+            self.domains[position].value(index - self.offsets[position])
+        )
+
+    def values(self, start: int = 0, stop: int = None):
+        if stop is None:
+            stop = self.size
+        for builder, domain, offset in zip(self.builders, self.domains, self.offsets):
+            low = max(start, offset) - offset
+            high = min(stop, offset + domain.size) - offset
+            if low < high:
+                yield from map(builder, domain.values(low, high))
+
+
+def _domain_BitVector(typ, machine):
+    return _BitVectorDomain(typ.width)
+
+
+def _domain_FVec(typ, machine):
+    return _ProductDomain([domain(typ.of, machine)] * typ.length, list)
+
+
+def _domain_Tuple(typ, machine):
+    return _ProductDomain([domain(elementtyp, machine) for elementtyp in typ], tuple)
+
+
+def _domain_Struct(typ, machine):
+    if len(typ.fields) == 1:
+        return domain(typ.fields[0][1], machine)
+    cls = getattr(machine.types, typ.name)
+    return _ProductDomain(
+        [domain(fieldtyp, machine) for (name, fieldtyp) in typ.fields],
+        lambda values: cls(*values),
+    )
+
+
+def _domain_Union(typ, machine):
+    builders = []
+    domains = []
+    for name, constructortyp in typ.constructors:
+        builders.append(constructor_builder(machine, name, constructortyp))
+        domains.append(domain(constructortyp, machine))
+    return _UnionDomain(builders, domains)
+
+
+# maps kinds to callables (typ, machine) -> Domain, kinds that are not in
+# here (ints, strings, Vec, generic bitvectors) are unbounded
+_domain_builders = {
+    "SmallFixedBitVector": _domain_BitVector,
+    "BigFixedBitVector": _domain_BitVector,
+    "Bool": lambda typ, machine: _ElementsDomain([False, True]),
+    "Unit": lambda typ, machine: _ElementsDomain([()]),
+    "Enum": lambda typ, machine: _ElementsDomain(typ.elements),
+    "FVec": _domain_FVec,
+    "Tuple": _domain_Tuple,
+    "Struct": _domain_Struct,
+    "Union": _domain_Union,
+}
+
+
+def register_domain_builder(kind: str, builder):
+    """Makes the types of a kind (see register_sailtype_kind) enumerable.
+
+    Args:
+        kind (str): Name of the kind.
+        builder: Callable (typ, machine) returning the Domain of typ.
+    """
+    _domain_builders[kind] = builder
+
+
+class UnboundedDomain(Exception):
+    """Raised for types whose values can not be enumerated."""
+
+
+def domain(typ, machine: _pydrofoil.RISCV64) -> Domain:
+    """Returns the (cached) Domain of typ, raises UnboundedDomain if typ has infinitely many values."""
+    cache = _machine_cache(machine)
+    domains = cache.get("domains")
+    if domains is None:
+        domains = cache["domains"] = {}
+    try:
+        result = domains[typ]
+    except KeyError:
+        pass
+    else:
+        if result is None:
+            raise UnboundedDomain(f"{typ} has infinitely many values")
+        return result
+    kind = sailtype_kind(typ)
+    builder = _domain_builders.get(kind)
+    if builder is None:
+        domains[typ] = None
+        raise UnboundedDomain(f"values of kind {kind} can not be enumerated")
+    # recursive types are unbounded
+    domains[typ] = None
+    result = domains[typ] = builder(typ, machine)
+    return result
+
+
+def domain_size(typ, machine: _pydrofoil.RISCV64) -> int:
+    """Returns the number of values of typ, or None if it has infinitely many."""
+    try:
+        return domain(typ, machine).size
+    except UnboundedDomain:
+        return None
+
+
+def shard_range(size: int, shard: int, shards: int) -> tuple:
+    """Returns the (start, stop) indices of shard number shard when splitting size values into shards parts."""
+    assert 0 <= shard < shards
+    return size * shard // shards, size * (shard + 1) // shards
+
+
+def enumerate_values(
+    typ,
+    machine: _pydrofoil.RISCV64,
+    budget: int = DEFAULT_BUDGET,
+    shard: int = 0,
+    shards: int = 1,
+):
+    """Lazily yields all values of typ, or of one shard of them.
+
+    Args:
+        typ: The pydrofoil type.
+        machine: Instance of _pydrofoil.RISCV64()
+        budget (int): Maximum number of values, a ValueError is raised for larger domains.
+        shard (int): Index of the shard to enumerate.
+        shards (int): Number of shards the values are split into.
+    """
+    values_domain = domain(typ, machine)
+    if budget is not None and values_domain.size > budget:
+        raise ValueError(
+            f"{typ} has {values_domain.size} values, more than the budget of {budget}"
+        )
+    start, stop = shard_range(values_domain.size, shard, shards)
+    return values_domain.values(start, stop)
@@ -0,0 +1,426 @@
+"""Fuzz harness calling every lowlevel function of a machine with random arguments.
+
+The arguments are generated from the sail type of every function (with a
+StreamingGenerator, so no Hypothesis overhead per call), and every result is
+checked against the result type. Run it with::
+
+    python -m pydrofoilhypothesis.fuzzing --budget 0.5 --output report.json
+
+Functions are run in worker processes, slowest first, so that a function
+crashing or hanging the emulator only costs its worker, which is replaced.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+import _pydrofoil
+
+from pydrofoilhypothesis import machinestate, streaming
+from pydrofoilhypothesis.pydrofoilhypothesis import sailtype_kind
+
+# number of example arguments kept per failure kind
+MAX_EXAMPLES = 3
+
+
+def lowlevel_functions(machine: _pydrofoil.RISCV64) -> list:
+    """Returns the names of all lowlevel functions of machine that have a sail type."""
+    return [
+        name
+        for name in dir(machine.lowlevel)
+        if getattr(getattr(machine.lowlevel, name), "sail_type", None) is not None
+    ]
+
+
+def _check_bitvector(value, typ, machine) -> bool:
+    return isinstance(value, _pydrofoil.bitvector) and len(value) == typ.width
+
+
+def _check_FVec(value, typ, machine) -> bool:
+    return (
+        isinstance(value, list)
+        and len(value) == typ.length
+        and all(result_matches(item, typ.of, machine) for item in value)
+    )
+
+
+def _check_Vec(value, typ, machine) -> bool:
+    return isinstance(value, list) and all(
+        result_matches(item, typ.of, machine) for item in value
+    )
+
+
+def _check_Tuple(value, typ, machine) -> bool:
+    elementtyps = list(typ)
+    return (
+        isinstance(value, tuple)
+        and len(value) == len(elementtyps)
+        and all(
+            result_matches(item, elementtyp, machine)
+            for item, elementtyp in zip(value, elementtyps)
+        )
+    )
+
+
+def _check_Struct(value, typ, machine) -> bool:
+    if len(typ.fields) == 1:
+        return result_matches(value, typ.fields[0][1], machine)
+    return isinstance(value, getattr(machine.types, typ.name))
+
+
+# maps kinds to callables (value, typ, machine) -> bool
+_result_checkers = {
+    "SmallFixedBitVector": _check_bitvector,
+    "BigFixedBitVector": _check_bitvector,
+    "GenericBitVector": lambda value, typ, machine: isinstance(value, _pydrofoil.bitvector),
+    "FVec": _check_FVec,
+    "Vec": _check_Vec,
+    "Bool": lambda value, typ, machine: isinstance(value, bool),
+    "MachineInt": lambda value, typ, machine: isinstance(value, int),
+    "Int": lambda value, typ, machine: isinstance(value, int),
+    "String": lambda value, typ, machine: isinstance(value, str),
+    "Enum": lambda value, typ, machine: value in typ.elements,
+    "Unit": lambda value, typ, machine: value == (),
+    "Tuple": _check_Tuple,
+    "Struct": _check_Struct,
+    "Union": lambda value, typ, machine: isinstance(value, getattr(machine.types, typ.name)),
+}
+
+
+def result_matches(value, typ, machine: _pydrofoil.RISCV64) -> bool:
+    """Returns whether value is a value of the pydrofoil type typ."""
+    checker = _result_checkers.get(sailtype_kind(typ))
+    if checker is None:
+        # kinds registered by the user are not checked
+        return True
+    return checker(value, typ, machine)
+
+
+class FunctionReport:
+    """The result of fuzzing one lowlevel function.
+
+    Attributes:
+        name (str): Name of the function.
+        status (str): "ok", "failed" (exceptions or result type mismatches),
+            "unsupported" (arguments can not be generated), "crashed" (the
+            worker process died) or "timeout" (a single call took too long).
+        calls (int): Number of calls.
+        seconds (float): Time spent in the function.
+        exceptions (dict): Maps exception class names to [count, message, example arguments].
+        mismatches (list): (arguments, result) reprs of calls whose result has the wrong type.
+        error (str): Details for the unsupported, crashed and timeout statuses.
+    """
+
+    def __init__(self, name: str, status: str = "ok", calls: int = 0, seconds: float = 0.0,
+                 exceptions: dict = None, mismatches: list = None, error: str = None):
+        self.name = name
+        self.status = status
+        self.calls = calls
+        self.seconds = seconds
+        self.exceptions = exceptions if exceptions is not None else {}
+        self.mismatches = mismatches if mismatches is not None else []
+        self.error = error
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FunctionReport":
+        return cls(**data)
+
+    def __repr__(self):
+        return f"<FunctionReport {self.name} {self.status} calls={self.calls}>"
+
+
+def fuzz_function(
+    machine: _pydrofoil.RISCV64,
+    name: str,
+    time_budget: float = 1.0,
+    max_calls: int = None,
+    seed=0,
+    restore: bool = True,
+) -> FunctionReport:
+    """Calls the lowlevel function name with random arguments until time_budget or max_calls is reached.
+
+    The machine is reset to its initial snapshot before every call, and once
+    at the end.
+
+    Args:
+        machine: Instance of _pydrofoil.RISCV64()
+        name (str): Name of the lowlevel function.
+        time_budget (float): Seconds to spend on the function.
+        max_calls (int): Maximum number of calls, unlimited by default.
+        seed: Seed for the generated arguments.
+        restore (bool): Whether to reset the machine before every call. Pass
+            False for pure functions, which neither read nor write machine
+            state: for cheap functions the reset costs more than the call.
+    """
+    report = FunctionReport(name)
+    function = getattr(machine.lowlevel, name)
+    typ = function.sail_type
+    generator = streaming.StreamingGenerator(machine, seed)
+    try:
+        samplers = [generator.sampler(argtyp) for argtyp in typ.arguments]
+    except Exception as e:
+        report.status = "unsupported"
+        report.error = f"{e.__class__.__name__}: {e}"
+        return report
+    snapshot = machinestate.initial_snapshot(machine)
+    result_typ = typ.result
+    deadline = time.perf_counter() + time_budget
+    exceptions = report.exceptions
+    while time.perf_counter() < deadline and (max_calls is None or report.calls < max_calls):
+        try:
+            args = [sample() for sample in samplers]
+        except Exception as e:
+            report.status = "unsupported"
+            report.error = f"{e.__class__.__name__}: {e}"
+            break
+        if restore:
+            snapshot.restore()
+        start = time.perf_counter()
+        try:
+            result = function(*args)
+        except Exception as e:
+            report.seconds += time.perf_counter() - start
+            entry = exceptions.get(e.__class__.__name__)
+            if entry is None:
+                exceptions[e.__class__.__name__] = [1, str(e), repr(args)]
+            else:
+                entry[0] += 1
+        else:
+            report.seconds += time.perf_counter() - start
+            if not result_matches(result, result_typ, machine) and len(report.mismatches) < MAX_EXAMPLES:
+                report.mismatches.append((repr(args), repr(result)))
+        report.calls += 1
+    snapshot.restore()
+    if report.status == "ok" and (report.exceptions or report.mismatches):
+        report.status = "failed"
+    return report
+
+
+class FuzzReport:
+    """The FunctionReports of a fuzzing run, by function name."""
+
+    def __init__(self, reports: dict = None):
+        self.reports = reports if reports is not None else {}
+
+    def add(self, report: FunctionReport):
+        self.reports[report.name] = report
+
+    def failures(self) -> list:
+        """Returns the reports of all functions whose status is not "ok", sorted by name."""
+        return [
+            report
+            for (name, report) in sorted(self.reports.items())
+            if report.status != "ok"
+        ]
+
+    def timings(self) -> dict:
+        """Returns the seconds per call of every function, to schedule the next run slowest first."""
+        return {
+            name: (report.seconds / report.calls if report.calls else float("inf"))
+            for (name, report) in self.reports.items()
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {name: report.to_dict() for (name, report) in sorted(self.reports.items())},
+            indent=2,
+        )
+
+    @classmethod
+    def from_json(cls, data: str) -> "FuzzReport":
+        return cls(
+            {name: FunctionReport.from_dict(report) for (name, report) in json.loads(data).items()}
+        )
+
+    def format_summary(self) -> str:
+        """Returns one line per status with the number of functions, followed by the failures."""
+        counts = {}
+        for report in self.reports.values():
+            counts[report.status] = counts.get(report.status, 0) + 1
+        lines = [f"{status}: {count}" for (status, count) in sorted(counts.items())]
+        for report in self.failures():
+            details = report.error or ", ".join(
+                [f"{name} x{count}" for (name, (count, message, args)) in sorted(report.exceptions.items())]
+                + ([f"{len(report.mismatches)} result type mismatches"] if report.mismatches else [])
+            )
+            lines.append(f"{report.status:12} {report.name}: {details}")
+        return "\n".join(lines)
+
+
+def _schedule(names: list, timings: dict) -> list:
+    """Sorts names slowest first, functions without timings are assumed to be slow."""
+    return sorted(names, key=lambda name: (-timings.get(name, float("inf")), name))
+
+
+def _worker(
+    machine_factory, tasks, results, current, started, time_budget, max_calls, seed, restore
+):
+    machine = machine_factory()
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, name = task
+        # shared memory instead of a message, so that the parent knows the
+        # function even if the worker dies before a message is sent
+        started.value = time.time()
+        current.value = index
+        report = fuzz_function(machine, name, time_budget, max_calls, seed, restore)
+        results.put(report.to_dict())
+        current.value = -1
+
+
+def fuzz_lowlevel(
+    machine_factory=_pydrofoil.RISCV64,
+    names: list = None,
+    workers: int = None,
+    time_budget: float = 1.0,
+    max_calls: int = None,
+    timeout: float = None,
+    timings: dict = None,
+    seed=0,
+    restore: bool = True,
+) -> FuzzReport:
+    """Fuzzes lowlevel functions in worker processes, see fuzz_function.
+
+    Args:
+        machine_factory: Callable creating a machine, called once per worker process.
+        names (list[str]): The functions to fuzz, defaults to lowlevel_functions.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        time_budget (float): Seconds to spend per function.
+        max_calls (int): Maximum number of calls per function.
+        timeout (float): Seconds after which a worker stuck in a function is
+            killed, defaults to 10 times the time budget plus 10 seconds.
+        timings (dict): Seconds per call of the functions, e.g. FuzzReport.timings()
+            of an earlier run, to start the slowest functions first.
+        seed: Seed for the generated arguments.
+        restore (bool): Whether to reset the machine before every call, see fuzz_function.
+    """
+    if names is None:
+        names = lowlevel_functions(machine_factory())
+    names = _schedule(names, timings or {})
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(names)))
+    if timeout is None:
+        timeout = time_budget * 10 + 10
+    report = FuzzReport()
+    pending = set(names)
+    tasks = multiprocessing.Queue()
+    results = multiprocessing.Queue()
+    for task in enumerate(names):
+        tasks.put(task)
+    # one stop marker per worker, a worker that dies in the middle of a
+    # function leaves its marker to its replacement
+    for _ in range(workers):
+        tasks.put(None)
+    processes = []  # (process, current task index, start time of the task)
+
+    def spawn():
+        current = multiprocessing.Value("i", -1)
+        started = multiprocessing.Value("d", 0.0)
+        process = multiprocessing.Process(
+            target=_worker,
+            args=(
+                machine_factory, tasks, results, current, started, time_budget, max_calls, seed, restore
+            ),
+            daemon=True,
+        )
+        process.start()
+        processes.append((process, current, started))
+
+    def drain(block: bool = False):
+        while True:
+            try:
+                data = results.get(timeout=0.1) if block else results.get_nowait()
+            except queue.Empty:
+                return
+            pending.discard(data["name"])
+            report.add(FunctionReport.from_dict(data))
+            block = False
+
+    def lost(index: int, status: str, started: float, error: str):
+        # the worker died or was killed in the middle of a function
+        name = names[index]
+        if name in pending:
+            pending.discard(name)
+            report.add(FunctionReport(name, status, seconds=time.time() - started, error=error))
+
+    for _ in range(workers):
+        spawn()
+    try:
+        while pending and processes:
+            drain(block=True)
+            for entry in list(processes):
+                process, current, started = entry
+                index = current.value
+                if not process.is_alive():
+                    processes.remove(entry)
+                    if index >= 0:
+                        drain()
+                        lost(index, "crashed", started.value, f"worker exited with code {process.exitcode}")
+                        spawn()
+                elif index >= 0 and time.time() - started.value > timeout:
+                    process.kill()
+                    process.join()
+                    processes.remove(entry)
+                    drain()
+                    lost(index, "timeout", started.value, f"no result after {timeout} seconds")
+                    spawn()
+        drain()
+        for name in sorted(pending):
+            report.add(FunctionReport(name, "crashed", error="no result from any worker"))
+    finally:
+        for process, current, started in processes:
+            process.join(1)
+            if process.is_alive():
+                process.kill()
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Call every lowlevel function of pydrofoil's RISCV64 with random arguments."
+    )
+    parser.add_argument("names", nargs="*", help="functions to fuzz, defaults to all")
+    parser.add_argument("--budget", type=float, default=1.0, help="seconds per function")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-restore", dest="restore", action="store_false",
+        help="don't reset the machine before every call, for pure functions",
+    )
+    parser.add_argument(
+        "--timings", default=None, metavar="PATH",
+        help="report of an earlier run, to start the slowest functions first",
+    )
+    parser.add_argument("--output", default=None, metavar="PATH", help="write the report as JSON")
+    args = parser.parse_args(argv)
+    timings = None
+    if args.timings:
+        with open(args.timings) as f:
+            timings = FuzzReport.from_json(f.read()).timings()
+    report = fuzz_lowlevel(
+        names=args.names or None,
+        workers=args.workers,
+        time_budget=args.budget,
+        timings=timings,
+        seed=args.seed,
+        restore=args.restore,
+    )
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report.to_json())
+    print(report.format_summary())
+    return 1 if report.failures() else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+import contextlib
+
+import _pydrofoil
+
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    _copy_mutable,
+    _machine_cache,
+    clear_machine_cache,
+)
+
+
+def register_names(machine: _pydrofoil.RISCV64) -> tuple:
+    """Returns the (cached) names of all registers in machine.register_info()."""
+    cache = _machine_cache(machine)
+    try:
+        return cache["register_names"]
+    except KeyError:
+        names = cache["register_names"] = tuple(
+            name for (name, typ) in machine.register_info()
+        )
+        return names
+
+
+def apply_register_values(
+    machine: _pydrofoil.RISCV64, values: dict, baseline: dict = None
+) -> list:
+    """Writes register values into the machine, skipping registers that already hold their value.
+
+    Args:
+        machine: The target pydrofoil machine.
+        values (dict): Mapping from register names to values, e.g. drawn from random_register_values.
+        baseline (dict): Register values the machine is known to hold, e.g.
+            initial_snapshot(machine).values right after restoring it. Registers
+            whose new value equals their baseline value are not written. Defaults
+            to the current values, which costs a read_register call per register.
+
+    Returns:
+        list[str]: The names of the registers that were written.
+    """
+    write_register = machine.write_register
+    written = []
+    if baseline is None:
+        read_register = machine.read_register
+        for name, value in values.items():
+            if read_register(name) != value:
+                write_register(name, value)
+                written.append(name)
+        return written
+    for name, value in values.items():
+        if name in baseline and baseline[name] == value:
+            continue
+        write_register(name, value)
+        written.append(name)
+    return written
+
+
+def read_register_values(machine: _pydrofoil.RISCV64, names: list = None) -> dict:
+    """Reads registers of the machine.
+
+    Args:
+        machine: The target pydrofoil machine.
+        names (list[str]): The registers to read, defaults to all registers in register_info().
+
+    Returns:
+        dict: Mapping from register names to values.
+    """
+    if names is None:
+        names = register_names(machine)
+    read_register = machine.read_register
+    return {name: read_register(name) for name in names}
+
+
+class MachineSnapshot:
+    """The values of all registers of a machine, captured at one point in time."""
+
+    def __init__(self, machine: _pydrofoil.RISCV64):
+        """Capture the current values of all registers in machine.register_info()."""
+        self.machine = machine
+        self.names = register_names(machine)
+        self.values = read_register_values(machine, self.names)
+
+    def dirty_registers(self) -> list:
+        """Returns the names of the registers whose value differs from the snapshot."""
+        values = self.values
+        read_register = self.machine.read_register
+        return [name for name in self.names if read_register(name) != values[name]]
+
+    def restore(self) -> list:
+        """Writes the snapshot back into the machine.
+
+        Only registers whose value changed since the snapshot was taken are
+        written.
+
+        Returns:
+            list[str]: The names of the registers that were written.
+        """
+        dirty = self.dirty_registers()
+        write_register = self.machine.write_register
+        values = self.values
+        for name in dirty:
+            write_register(name, _copy_mutable(values[name]))
+        return dirty
+
+    @contextlib.contextmanager
+    def restored(self):
+        """Context manager that restores the snapshot on entry and on exit.
+
+        Yields the machine, e.g. in the body of a Hypothesis test::
+
+            with snapshot.restored() as machine:
+                machine.lowlevel.execute(instruction)
+        """
+        self.restore()
+        try:
+            yield self.machine
+        finally:
+            self.restore()
+
+
+def initial_snapshot(machine: _pydrofoil.RISCV64) -> MachineSnapshot:
+    """Returns the snapshot of machine taken the first time this function was called for it."""
+    cache = _machine_cache(machine)
+    try:
+        return cache["initial_snapshot"]
+    except KeyError:
+        snapshot = cache["initial_snapshot"] = MachineSnapshot(machine)
+        return snapshot
+
+
+def restored_machine(machine: _pydrofoil.RISCV64):
+    """Context manager resetting machine to its initial snapshot on entry and on exit.
+
+    The initial snapshot is captured the first time the machine is passed to
+    restored_machine or initial_snapshot.
+    """
+    return initial_snapshot(machine).restored()
+
+
+class MachinePool:
+    """A pool of warm machines of one class.
+
+    Machines are created on demand and reset to their initial snapshot when
+    they are released, so creating machines and capturing their snapshots
+    happens only once per process.
+    """
+
+    def __init__(self, factory=_pydrofoil.RISCV64, machines: list = ()):
+        """Initialize the pool.
+
+        Args:
+            factory: Callable creating a new machine.
+            machines (list): Existing machines to add to the pool, their initial
+                snapshot is captured now if it was not captured before.
+        """
+        self.factory = factory
+        self.machines = []
+        self._free = []
+        # the machines created by the pool, their caches are dropped by close
+        self._created = []
+        for machine in machines:
+            self._add(machine)
+
+    def _create(self):
+        machine = self.factory()
+        self._created.append(machine)
+        self._add(machine)
+
+    def _add(self, machine: _pydrofoil.RISCV64):
+        initial_snapshot(machine)
+        self.machines.append(machine)
+        self._free.append(machine)
+
+    def warm(self, count: int):
+        """Creates machines until the pool contains at least count machines."""
+        while len(self.machines) < count:
+            self._create()
+
+    def acquire(self) -> _pydrofoil.RISCV64:
+        """Returns a machine in its initial state that is not used by anybody else."""
+        if not self._free:
+            self._create()
+        machine = self._free.pop(0)
+        initial_snapshot(machine).restore()
+        return machine
+
+    def release(self, machine: _pydrofoil.RISCV64):
+        """Resets machine to its initial state and returns it to the pool."""
+        initial_snapshot(machine).restore()
+        if machine not in self._free:
+            self._free.append(machine)
+
+    @contextlib.contextmanager
+    def machine(self):
+        """Context manager acquiring a machine and releasing it on exit."""
+        machine = self.acquire()
+        try:
+            yield machine
+        finally:
+            self.release(machine)
+
+    def reset(self):
+        """Resets all machines to their initial state and releases them."""
+        for machine in self.machines:
+            initial_snapshot(machine).restore()
+        self._free = list(self.machines)
+
+    def close(self):
+        """Empties the pool and drops the caches of the machines it created.
+
+        Machines that were passed to the constructor are reset, but keep their caches.
+        """
+        for machine in self.machines:
+            initial_snapshot(machine).restore()
+        for machine in self._created:
+            clear_machine_cache(machine)
+        self.machines = []
+        self._free = []
+        self._created = []
+
+
+class StateDiff:
+    """Finds the registers of a machine that changed, e.g. by executing an instruction.
+
+    Usage::
+
+        diff = StateDiff(machine)
+        with diff:
+            machine.lowlevel.execute(instruction)
+        diff.assert_only_changed([f"x{rd.unsigned()}"])
+    """
+
+    def __init__(self, machine: _pydrofoil.RISCV64, registers: list = None):
+        """Prepare the comparison.
+
+        Args:
+            machine: The pydrofoil machine.
+            registers (list[str]): The registers to compare, defaults to all registers in register_info().
+        """
+        if registers is None:
+            registers = register_names(machine)
+        self.machine = machine
+        self.names = tuple(registers)
+        self.before = None
+
+    def capture(self):
+        """Captures the before-image of the registers."""
+        read_register = self.machine.read_register
+        self.before = tuple([read_register(name) for name in self.names])
+
+    def __enter__(self):
+        self.capture()
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def changed(self) -> dict:
+        """Returns a dict mapping the names of changed registers to (old value, new value) pairs."""
+        assert self.before is not None, "call capture() first"
+        read_register = self.machine.read_register
+        result = {}
+        for name, old in zip(self.names, self.before):
+            new = read_register(name)
+            if new != old:
+                result[name] = (old, new)
+        return result
+
+    def changed_registers(self) -> list:
+        """Returns the names of the registers that changed since capture()."""
+        return list(self.changed())
+
+    def assert_only_changed(self, allowed) -> dict:
+        """Asserts that no register outside of allowed changed since capture().
+
+        Args:
+            allowed: The names of the registers that may change.
+
+        Returns:
+            dict: The changes, like changed().
+        """
+        changes = self.changed()
+        allowed = set(allowed)
+        unexpected = {
+            name: change for (name, change) in changes.items() if name not in allowed
+        }
+        assert not unexpected, "unexpected register changes: " + ", ".join(
+            f"{name}: {old!r} -> {new!r}" for (name, (old, new)) in unexpected.items()
+        )
+        return changes
@@ -0,0 +1,150 @@
+"""Opt-in memoization of pure lowlevel functions (e.g. *_mnemonic_* mappings)."""
+
+import collections
+
+import _pydrofoil
+
+from pydrofoilhypothesis.pydrofoilhypothesis import _copy_mutable
+
+DEFAULT_MAXSIZE = 4096
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ["hits", "misses", "uncached", "maxsize", "currsize"]
+)
+
+
+# types whose hash and equality depend only on their value. enum values are
+# strings
+_VALUE_TYPES = (bool, int, str, bytes, float, type(None))
+
+
+class _Unhashable(Exception):
+    pass
+
+
+def _key(value):
+    """Returns a key for a value that is hashed by value, raises _Unhashable if there is none.
+
+    Other objects (e.g. structs and union values) may be hashed by identity,
+    and a struct that was changed in place would hit the entry of its old value.
+    """
+    if isinstance(value, _pydrofoil.bitvector):
+        return (len(value), value.unsigned())
+    if isinstance(value, (tuple, list)):
+        return (value.__class__, tuple([_key(item) for item in value]))
+    if isinstance(value, _VALUE_TYPES):
+        return value
+    raise _Unhashable
+
+
+class MemoizedFunction:
+    """A lowlevel function with a bounded LRU cache of its results.
+
+    Only use it for pure functions: functions that neither read nor write
+    machine state. Only calls whose arguments and result are bitvectors,
+    enums, bools, ints, strings and tuples or lists of them are cached, lists
+    in cached results are copied for every caller. Calls with other arguments
+    or results (e.g. structs and union values, which can be changed in
+    place) are passed through and counted as uncached.
+    """
+
+    def __init__(self, function, maxsize: int = DEFAULT_MAXSIZE):
+        self.function = function
+        self.sail_type = getattr(function, "sail_type", None)
+        self.maxsize = maxsize
+        self._cache = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.uncached = 0
+
+    def __call__(self, *args):
+        try:
+            key = tuple([_key(arg) for arg in args])
+        except _Unhashable:
+            self.uncached += 1
+            return self.function(*args)
+        cache = self._cache
+        try:
+            result = cache[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            cache.move_to_end(key)
+            return _copy_mutable(result)
+        result = self.function(*args)
+        try:
+            _key(result)
+        except _Unhashable:
+            self.uncached += 1
+            return result
+        self.misses += 1
+        cache[key] = result
+        if len(cache) > self.maxsize:
+            cache.popitem(last=False)
+        return _copy_mutable(result)
+
+    def cache_info(self) -> CacheInfo:
+        """Returns the hit statistics, like functools.lru_cache."""
+        return CacheInfo(
+            self.hits, self.misses, self.uncached, self.maxsize, len(self._cache)
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        """The fraction of calls answered from the cache."""
+        calls = self.hits + self.misses + self.uncached
+        return self.hits / calls if calls else 0.0
+
+    def cache_clear(self):
+        """Empties the cache and resets the statistics."""
+        self._cache.clear()
+        self.hits = self.misses = self.uncached = 0
+
+
+class MemoizedLowlevel:
+    """Stands in for machine.lowlevel, with memoized versions of the given pure functions.
+
+    All other functions are the machine's own::
+
+        lowlevel = MemoizedLowlevel(m, ["vitype_mnemonic_forwards", "vitype_mnemonic_backwards"])
+        lowlevel.vitype_mnemonic_forwards(op)
+        print(lowlevel.format_stats())
+    """
+
+    def __init__(self, machine: _pydrofoil.RISCV64, names: list, maxsize: int = DEFAULT_MAXSIZE):
+        """Wrap the functions.
+
+        Args:
+            machine: The pydrofoil machine.
+            names (list[str]): Names of the pure lowlevel functions to memoize.
+            maxsize (int): Maximum number of cached results per function.
+        """
+        self._lowlevel = machine.lowlevel
+        self.functions = {
+            name: MemoizedFunction(getattr(machine.lowlevel, name), maxsize)
+            for name in names
+        }
+        self.__dict__.update(self.functions)
+
+    def __getattr__(self, name: str):
+        return getattr(self._lowlevel, name)
+
+    def stats(self) -> dict:
+        """Returns a dict mapping the names of the memoized functions to their CacheInfo."""
+        return {name: function.cache_info() for name, function in self.functions.items()}
+
+    def format_stats(self) -> str:
+        """Returns the statistics as a table, one memoized function per line."""
+        lines = [f"{'function':40} {'hits':>10} {'misses':>10} {'uncached':>10} {'hit rate':>9}"]
+        for name, function in sorted(self.functions.items()):
+            info = function.cache_info()
+            lines.append(
+                f"{name:40} {info.hits:10} {info.misses:10} {info.uncached:10} {function.hit_rate:9.1%}"
+            )
+        return "\n".join(lines)
+
+    def cache_clear(self):
+        """Empties the caches of all memoized functions."""
+        for function in self.functions.values():
+            function.cache_clear()
@@ -0,0 +1,213 @@
+"""Sparse memory images and Hypothesis strategies generating them."""
+
+import random
+import struct
+
+import _pydrofoil
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+PAGE_SIZE = 4096
+WORD_SIZE = 8
+
+# maximal number of explicitly drawn words per page, the rest of a page is
+# filled from a drawn seed so that large images stay cheap to generate
+MAX_WORDS_PER_PAGE = 16
+
+_word_struct = struct.Struct("<Q")
+
+
+def _address(address) -> int:
+    """Converts a bitvector address to an int."""
+    if isinstance(address, int):
+        return address
+    return address.unsigned()
+
+
+class MemoryImage:
+    """A sparse, page-granular memory image.
+
+    Pages are bytearrays of page_size bytes, stored in a dict by page number.
+    Memory that is not part of any page reads as zero.
+    """
+
+    def __init__(self, page_size: int = PAGE_SIZE):
+        assert page_size % WORD_SIZE == 0, "page_size must be a multiple of 8"
+        self.page_size = page_size
+        self.pages = {}
+
+    def page(self, number: int) -> bytearray:
+        """Returns the page with the given number, creating a zero page if it does not exist."""
+        try:
+            return self.pages[number]
+        except KeyError:
+            page = self.pages[number] = bytearray(self.page_size)
+            return page
+
+    def write(self, address, data: bytes):
+        """Writes data at address, the data may span several pages."""
+        address = _address(address)
+        data = memoryview(data)
+        while data:
+            number, offset = divmod(address, self.page_size)
+            size = min(len(data), self.page_size - offset)
+            self.page(number)[offset : offset + size] = data[:size]
+            data = data[size:]
+            address += size
+
+    def read(self, address, size: int) -> bytes:
+        """Reads size bytes at address."""
+        address = _address(address)
+        result = bytearray()
+        while size:
+            number, offset = divmod(address, self.page_size)
+            chunk = min(size, self.page_size - offset)
+            page = self.pages.get(number)
+            if page is None:
+                result += bytes(chunk)
+            else:
+                result += memoryview(page)[offset : offset + chunk]
+            size -= chunk
+            address += chunk
+        return bytes(result)
+
+    def write_word(self, address, value: int, size: int = WORD_SIZE):
+        """Writes value as a little-endian word of size bytes."""
+        self.write(address, value.to_bytes(size, "little"))
+
+    def read_word(self, address, size: int = WORD_SIZE) -> int:
+        """Reads a little-endian word of size bytes."""
+        return int.from_bytes(self.read(address, size), "little")
+
+    def __len__(self) -> int:
+        """Returns the number of pages."""
+        return len(self.pages)
+
+    def nbytes(self) -> int:
+        """Returns the number of bytes stored in the image."""
+        return len(self.pages) * self.page_size
+
+    def words(self):
+        """Yields (address, value) for all non-zero 8-byte words, in address order."""
+        for number in sorted(self.pages):
+            base = number * self.page_size
+            for index, (value,) in enumerate(_word_struct.iter_unpack(self.pages[number])):
+                if value:
+                    yield base + index * WORD_SIZE, value
+
+    def load(self, writer) -> int:
+        """Writes the image into memory page by page.
+
+        pydrofoil machines have no memory API, so the caller passes the
+        function writing to the memory of their harness.
+
+        Args:
+            writer: A function (address, data) writing data, a memoryview of
+                page_size bytes, to memory starting at address.
+
+        Returns:
+            int: The number of written pages.
+        """
+        page_size = self.page_size
+        for number in sorted(self.pages):
+            writer(number * page_size, memoryview(self.pages[number]))
+        return len(self.pages)
+
+    def load_words(self, writer) -> int:
+        """Writes the non-zero words of the image into memory, for memories that are written word by word.
+
+        Args:
+            writer: A function (address, value) writing a little-endian 8-byte word.
+
+        Returns:
+            int: The number of written words.
+        """
+        count = 0
+        for address, value in self.words():
+            writer(address, value)
+            count += 1
+        return count
+
+    def __eq__(self, other):
+        if not isinstance(other, MemoryImage):
+            return NotImplemented
+        return self.page_size == other.page_size and self.pages == other.pages
+
+    def __repr__(self):
+        return f"<MemoryImage with {len(self.pages)} pages of {self.page_size} bytes>"
+
+
+def satp_page_table_address(satp) -> int:
+    """Returns the address of the root page table of an Sv39/Sv48 satp value."""
+    return (_address(satp) & (2 ** 44 - 1)) * PAGE_SIZE
+
+
+def register_addresses(machine: _pydrofoil.RISCV64, names: list) -> list:
+    """Returns the current values of the given bitvector registers as addresses, e.g. to bias memory_images."""
+    return [_address(machine.read_register(name)) for name in names]
+
+
+def memory_images(
+    min_pages: int = 0,
+    max_pages: int = 8,
+    page_size: int = PAGE_SIZE,
+    address_bits: int = 39,
+    near: list = (),
+    near_pages: int = 1,
+    words=None,
+):
+    """Hypothesis strategy generating sparse MemoryImage values.
+
+    Every page is either zero or filled from a drawn seed, then a few explicitly
+    drawn words are written into it. Page contents therefore cost only a few
+    draws, independent of the page size.
+
+    Args:
+        min_pages (int): Minimum number of pages.
+        max_pages (int): Maximum number of pages.
+        page_size (int): Size of a page in bytes.
+        address_bits (int): Pages are placed below 2**address_bits.
+        near (list): Addresses (ints or bitvectors) that pages are biased towards,
+            e.g. the root page table (see satp_page_table_address) or the values
+            of address registers (see register_addresses).
+        near_pages (int): Pages up to this distance from an address in near are preferred.
+        words: Strategy for the explicitly drawn words, defaults to 64-bit integers.
+    """
+    max_page_number = 2 ** address_bits // page_size - 1
+    page_numbers = st.integers(0, max_page_number)
+    hot_pages = sorted(
+        {
+            number
+            for address in near
+            for number in range(
+                _address(address) // page_size - near_pages,
+                _address(address) // page_size + near_pages + 1,
+            )
+            if 0 <= number <= max_page_number
+        }
+    )
+    if hot_pages:
+        page_numbers = st.one_of(st.sampled_from(hot_pages), page_numbers)
+    if words is None:
+        words = st.integers(0, 2 ** 64 - 1)
+    return _gen_memory_image(page_size, min_pages, max_pages, page_numbers, words)
+
+
+@st.composite
+def _gen_memory_image(
+    draw: DrawFn, page_size: int, min_pages: int, max_pages: int, page_numbers, words
+) -> MemoryImage:
+    image = MemoryImage(page_size)
+    numbers = draw(
+        st.lists(page_numbers, min_size=min_pages, max_size=max_pages, unique=True)
+    )
+    offsets = st.integers(0, page_size // WORD_SIZE - 1)
+    for number in numbers:
+        page = image.page(number)
+        # 0 means a zero page
+        seed = draw(st.integers(0, 2 ** 32 - 1))
+        if seed:
+            page[:] = random.Random(seed).randbytes(page_size)
+        for offset in draw(st.lists(offsets, max_size=MAX_WORDS_PER_PAGE)):
+            _word_struct.pack_into(page, offset * WORD_SIZE, draw(words))
+    return image
@@ -0,0 +1,229 @@
+import concurrent.futures
+import os
+import traceback
+
+import _pydrofoil
+from hypothesis import given, seed, settings, Phase
+
+from pydrofoilhypothesis import enumeration, machinestate
+from pydrofoilhypothesis.pydrofoilhypothesis import clear_machine_cache
+
+
+class ParallelPropertyFailure(Exception):
+    """Raised when a worker found a failing example that the parent could not reproduce."""
+
+
+# the machine of the current worker process, created by _init_worker
+_worker_machine = None
+
+
+def run_parallel(
+    strategy_factory,
+    property_function,
+    workers: int = None,
+    max_examples: int = 100,
+    shards: int = None,
+    base_seed: int = 0,
+    machine_factory=_pydrofoil.RISCV64,
+):
+    """Checks a property with Hypothesis, spreading the examples over worker processes.
+
+    Every worker process creates one machine and keeps it for all the shards
+    it runs, the machine is reset to its initial snapshot around every
+    example. A shard is a Hypothesis run with its own seed and a share of
+    max_examples that only generates examples, it does not shrink. If shards
+    fail, the parent process reruns the failing shard with the lowest seed
+    against its own machine, which finds the same example again, shrinks it
+    and raises the error like a normal Hypothesis test.
+
+    strategy_factory, property_function and machine_factory are sent to the
+    worker processes, so they have to be picklable (e.g. module-level functions).
+
+    Args:
+        strategy_factory: Callable (machine) returning the Hypothesis strategy, e.g. using
+            hypothesis_from_pydrofoil_type or random_register_values.
+        property_function: Callable (machine, value) that raises an exception if the property is violated.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        max_examples (int): Number of examples to generate in total.
+        shards (int): Number of Hypothesis runs to split max_examples into, defaults to 4 per worker.
+        base_seed (int): Seed of the first shard, the following shards use the next seeds.
+        machine_factory: Callable creating a machine, called once per process.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if shards is None:
+        shards = workers * 4
+    shards = max(1, min(shards, max_examples))
+    examples_per_shard = -(-max_examples // shards)
+    seeds = [base_seed + index for index in range(shards)]
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(machine_factory,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                _run_shard,
+                strategy_factory,
+                property_function,
+                examples_per_shard,
+                shard_seed,
+            )
+            for shard_seed in seeds
+        ]
+        failures = [future.result() for future in futures]
+    failures = [failure for failure in failures if failure is not None]
+    if not failures:
+        return
+    shard_seed, worker_traceback = min(failures)
+    machine = machine_factory()
+    test = _build_test(
+        machine,
+        strategy_factory,
+        property_function,
+        examples_per_shard,
+        shard_seed,
+        phases=(Phase.generate, Phase.shrink),
+    )
+    try:
+        test()
+    finally:
+        clear_machine_cache(machine)
+    raise ParallelPropertyFailure(
+        f"shard with seed {shard_seed} failed in a worker process, but not when "
+        f"it was rerun in the parent process:\n{worker_traceback}"
+    )
+
+
+def run_exhaustive(
+    type_factory,
+    property_function,
+    workers: int = None,
+    shards: int = None,
+    budget: int = None,
+    machine_factory=_pydrofoil.RISCV64,
+):
+    """Checks a property for every value of a type with a small domain, in worker processes.
+
+    The values are split into shards of contiguous indices (see
+    enumeration.enumerate_values), every shard stops at its first failing
+    value. Every value is checked on a machine reset to its initial snapshot. The parent process then checks the failing value with the lowest
+    index against its own machine, so that the error is raised like in a
+    normal test.
+
+    Args:
+        type_factory: Callable (machine) returning the pydrofoil type.
+        property_function: Callable (machine, value) that raises an exception if the property is violated.
+        workers (int): Number of worker processes, defaults to the number of CPUs.
+        shards (int): Number of shards, defaults to 4 per worker.
+        budget (int): Maximum number of values, defaults to enumeration.DEFAULT_BUDGET.
+        machine_factory: Callable creating a machine, called once per process.
+
+    Returns:
+        int: The number of checked values.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if shards is None:
+        shards = workers * 4
+    if budget is None:
+        budget = enumeration.DEFAULT_BUDGET
+    machine = machine_factory()
+    try:
+        return _run_exhaustive(
+            machine, type_factory, property_function, workers, shards, budget, machine_factory
+        )
+    finally:
+        clear_machine_cache(machine)
+
+
+def _run_exhaustive(
+    machine, type_factory, property_function, workers, shards, budget, machine_factory
+):
+    typ = type_factory(machine)
+    size = enumeration.domain_size(typ, machine)
+    if size is None:
+        raise enumeration.UnboundedDomain(f"{typ} has infinitely many values")
+    if size > budget:
+        raise ValueError(f"{typ} has {size} values, more than the budget of {budget}")
+    shards = max(1, min(shards, size))
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(machine_factory,)
+    ) as executor:
+        futures = [
+            executor.submit(
+                _run_exhaustive_shard, type_factory, property_function, shard, shards
+            )
+            for shard in range(shards)
+        ]
+        failures = [future.result() for future in futures]
+    failures = [failure for failure in failures if failure is not None]
+    if not failures:
+        return size
+    index, worker_traceback = min(failures)
+    with machinestate.initial_snapshot(machine).restored():
+        property_function(machine, enumeration.domain(typ, machine).value(index))
+    raise ParallelPropertyFailure(
+        f"value number {index} failed in a worker process, but not when it was "
+        f"checked again in the parent process:\n{worker_traceback}"
+    )
+
+
+def _run_exhaustive_shard(type_factory, property_function, shard, shards):
+    """Checks one shard in a worker, returns (index, traceback) of the first failing value, else None."""
+    machine = _worker_machine
+    snapshot = machinestate.initial_snapshot(machine)
+    values_domain = enumeration.domain(type_factory(machine), machine)
+    start, stop = enumeration.shard_range(values_domain.size, shard, shards)
+    try:
+        for index, value in enumerate(values_domain.values(start, stop), start):
+            snapshot.restore()
+            try:
+                property_function(machine, value)
+            except Exception:
+                return (index, traceback.format_exc())
+    finally:
+        snapshot.restore()
+    return None
+
+
+def _init_worker(machine_factory):
+    global _worker_machine
+    _worker_machine = machine_factory()
+    machinestate.initial_snapshot(_worker_machine)
+
+
+def _run_shard(strategy_factory, property_function, max_examples, shard_seed):
+    """Runs one shard in a worker, returns (seed, traceback) if it failed, else None."""
+    test = _build_test(
+        _worker_machine,
+        strategy_factory,
+        property_function,
+        max_examples,
+        shard_seed,
+        phases=(Phase.generate,),
+    )
+    try:
+        test()
+    except Exception:
+        return (shard_seed, traceback.format_exc())
+    return None
+
+
+def _build_test(
+    machine, strategy_factory, property_function, max_examples, shard_seed, phases
+):
+    snapshot = machinestate.initial_snapshot(machine)
+
+    @seed(shard_seed)
+    @settings(
+        max_examples=max_examples,
+        database=None,
+        deadline=None,
+        phases=phases,
+        print_blob=False,
+    )
+    @given(strategy_factory(machine))
+    def test(value):
+        with snapshot.restored():
+            property_function(machine, value)
+
+    return test
@@ -0,0 +1,143 @@
+"""pytest plugin of pydrofoilhypothesis.
+
+Enable it with ``pytest_plugins = ["pydrofoilhypothesis.plugin"]``, or with
+``pytest -p pydrofoilhypothesis.plugin`` to also get the command line options
+(e.g. ``--pydrofoil-profile``).
+
+All fixtures are session-scoped, so every process (including every
+pytest-xdist worker) creates its machines and strategies once. Machines of
+the pool are reset to their initial state after every test.
+"""
+
+import pytest
+import _pydrofoil
+
+from pydrofoilhypothesis import machinestate, profiling
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    random_register_values,
+    strategies_for_machine,
+)
+
+_pool_key = pytest.StashKey()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("pydrofoilhypothesis")
+    group.addoption(
+        "--pydrofoil-profile",
+        action="store",
+        default=None,
+        metavar="PATH",
+        help="record generation statistics per sail type and write them as JSON "
+        "to PATH at the end of the session, '-' prints them as a table",
+    )
+
+
+def pytest_configure(config):
+    if config.getoption("pydrofoil_profile", None):
+        profiling.enable_profiling()
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    path = config.getoption("pydrofoil_profile", None)
+    profile = profiling.active_profile()
+    if not path or profile is None:
+        return
+    if path == "-":
+        terminalreporter.write_sep("=", "pydrofoil generation profile")
+        terminalreporter.write_line(profile.format_table(limit=50))
+    else:
+        with open(path, "w") as f:
+            f.write(profile.to_json())
+        terminalreporter.write_line(f"pydrofoil generation profile written to {path}")
+
+
+def pytest_runtest_teardown(item, nextitem):
+    pool = item.config.stash.get(_pool_key, None)
+    if pool is not None:
+        pool.reset()
+
+
+@pytest.fixture(scope="session")
+def pydrofoil_machine() -> _pydrofoil.RISCV64:
+    """The machine used by the other fixtures. Override it to use your own machine."""
+    return _pydrofoil.RISCV64()
+
+
+@pytest.fixture(scope="session")
+def pydrofoil_snapshot(pydrofoil_machine) -> machinestate.MachineSnapshot:
+    """The initial snapshot of pydrofoil_machine.
+
+    Hypothesis runs many examples per test function, so reset the machine in
+    every example with ``with pydrofoil_snapshot.restored(): ...``.
+    """
+    snapshot = machinestate.initial_snapshot(pydrofoil_machine)
+    snapshot.restore()
+    yield snapshot
+    snapshot.restore()
+
+
+@pytest.fixture(scope="session")
+def pydrofoil_pool(request, pydrofoil_machine) -> machinestate.MachinePool:
+    """A MachinePool of machines like pydrofoil_machine, starting with pydrofoil_machine itself.
+
+    Use ``with pydrofoil_pool.machine() as machine: ...`` in tests that need
+    additional machines, e.g. to compare two executions.
+    """
+    pool = machinestate.MachinePool(pydrofoil_machine.__class__, [pydrofoil_machine])
+    request.config.stash[_pool_key] = pool
+    yield pool
+    del request.config.stash[_pool_key]
+    pool.close()
+
+
+class StrategyFactory:
+    """Returns the cached strategies of a machine by sail type, register name or type name."""
+
+    def __init__(self, machine: _pydrofoil.RISCV64, strategies=None):
+        """Initialize the factory.
+
+        Args:
+            machine: The pydrofoil machine.
+            strategies: The BasePydrofoilStrategies to use, defaults to strategies_for_machine(machine).
+        """
+        if strategies is None:
+            strategies = strategies_for_machine(machine)
+        self.machine = machine
+        self.strategies = strategies
+        self._register_types = None
+
+    def __call__(self, typ):
+        """Returns the strategy for the sail type typ."""
+        return self.strategies.hypothesis_from_pydrofoil_type(typ)
+
+    def register(self, name: str):
+        """Returns the strategy for values of the register with the given name."""
+        if self._register_types is None:
+            self._register_types = dict(self.machine.register_info())
+        return self(self._register_types[name])
+
+    def type(self, name: str):
+        """Returns the strategy for the type called name, e.g. "ast"."""
+        return self(getattr(self.machine.types, name).sail_type)
+
+    def arguments(self, function: str) -> list:
+        """Returns the strategies for the arguments of the lowlevel function with the given name."""
+        typ = getattr(self.machine.lowlevel, function).sail_type
+        return [self(argtyp) for argtyp in typ.arguments]
+
+    def registers(self, include_registers=(), always_default_registers=()):
+        """Returns random_register_values(machine, include_registers, always_default_registers)."""
+        return random_register_values(
+            self.machine, include_registers, always_default_registers
+        )
+
+
+@pytest.fixture(scope="session")
+def pydrofoil_strategies(pydrofoil_machine) -> StrategyFactory:
+    """A StrategyFactory of pydrofoil_machine, e.g. ``pydrofoil_strategies.register("x1")``.
+
+    Hypothesis strategies are needed at decoration time, so in @given tests
+    draw from them with ``st.data()``.
+    """
+    return StrategyFactory(pydrofoil_machine)
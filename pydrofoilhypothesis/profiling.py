@@ -0,0 +1,113 @@
+import json
+import time
+
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+
+class GenerationProfile:
+    """Statistics about drawn values, per sail type and per gen_* hook.
+
+    For every (type, hook) pair it records the number of draws, the total
+    wall time including nested types, the time spent in the type itself
+    excluding nested types, and the number of bytes drawn from the
+    Hypothesis buffer (including nested types).
+    """
+
+    def __init__(self):
+        # (type name, hook) -> [draws, total seconds, self seconds, bytes]
+        self.stats = {}
+        # time spent in nested draws, one entry per active profiled draw
+        self._nested_seconds = []
+
+    def reset(self):
+        """Forgets all recorded statistics."""
+        self.stats.clear()
+
+    def rows(self) -> list:
+        """Returns the statistics as a list of dicts, most expensive type first."""
+        rows = [
+            {
+                "type": typename,
+                "hook": hook,
+                "draws": draws,
+                "seconds": seconds,
+                "self_seconds": self_seconds,
+                "bytes": size,
+            }
+            for ((typename, hook), (draws, seconds, self_seconds, size)) in (
+                self.stats.items()
+            )
+        ]
+        rows.sort(key=lambda row: row["self_seconds"], reverse=True)
+        return rows
+
+    def to_json(self) -> str:
+        """Returns the statistics as a JSON string."""
+        return json.dumps(self.rows(), indent=2)
+
+    def format_table(self, limit: int = None) -> str:
+        """Returns the statistics as a text table, limited to the limit most expensive rows."""
+        rows = self.rows()[:limit]
+        lines = [
+            f"{'type':<40} {'hook':<24} {'draws':>9} {'total s':>10} {'self s':>10} {'bytes':>11}"
+        ]
+        for row in rows:
+            lines.append(
+                f"{row['type'][:40]:<40} {row['hook'][:24]:<24} {row['draws']:>9} "
+                f"{row['seconds']:>10.4f} {row['self_seconds']:>10.4f} {row['bytes']:>11}"
+            )
+        return "\n".join(lines)
+
+    def profiled(self, strategy, typename: str, hook: str):
+        """Returns a strategy drawing from strategy and recording the draws under (typename, hook)."""
+        return _profiled(strategy, self, (typename, hook))
+
+
+@st.composite
+def _profiled(draw: DrawFn, strategy, profile: GenerationProfile, key: tuple):
+    data = getattr(draw, "__self__", None)
+    start_size = getattr(data, "length", 0)
+    nested_seconds = profile._nested_seconds
+    nested_seconds.append(0.0)
+    start = time.perf_counter()
+    try:
+        return draw(strategy)
+    finally:
+        seconds = time.perf_counter() - start
+        own_seconds = seconds - nested_seconds.pop()
+        if nested_seconds:
+            nested_seconds[-1] += seconds
+        stats = profile.stats.get(key)
+        if stats is None:
+            stats = profile.stats[key] = [0, 0.0, 0.0, 0]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] += own_seconds
+        stats[3] += getattr(data, "length", 0) - start_size
+
+
+# the profile used by BasePydrofoilStrategies instances that were not given one
+_active_profile = None
+
+
+def enable_profiling() -> GenerationProfile:
+    """Makes all strategies looked up from now on record their draws, returns the profile they record into.
+
+    Strategies looked up before are not changed.
+    """
+    global _active_profile
+    if _active_profile is None:
+        _active_profile = GenerationProfile()
+    return _active_profile
+
+
+def disable_profiling():
+    """Stops profiling strategies looked up from now on."""
+    global _active_profile
+    _active_profile = None
+
+
+def active_profile() -> GenerationProfile:
+    """Returns the profile enabled by enable_profiling, or None."""
+    return _active_profile
@@ -0,0 +1,286 @@
+"""Strategies for instruction sequences (programs) and a loop executing them."""
+
+import bisect
+
+import _pydrofoil
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    _bitvector,
+    constructor_builder,
+    sailtype_kind,
+    strategies_for_machine,
+)
+
+
+# indices of the register-index fields (rd, rs1, rs2) of the RISC-V ast
+# constructors, in the order of the sail model. pydrofoil does not name the
+# fields of tuple constructors, and other fields have the same type as
+# register indices (e.g. the shamt of SHIFTIWOP), so they are listed here
+REGISTER_FIELDS = {
+    "UTYPE": (1,),
+    "RISCV_JAL": (1,),
+    "RISCV_JALR": (1, 2),
+    "BTYPE": (1, 2),
+    "ITYPE": (1, 2),
+    "SHIFTIOP": (1, 2),
+    "RTYPE": (0, 1, 2),
+    "LOAD": (1, 2),
+    "STORE": (1, 2),
+    "ADDIW": (1, 2),
+    "RTYPEW": (0, 1, 2),
+    "SHIFTIWOP": (1, 2),
+    "MUL": (0, 1, 2),
+    "DIV": (0, 1, 2),
+    "REM": (0, 1, 2),
+    "MULW": (0, 1, 2),
+    "DIVW": (0, 1, 2),
+    "REMW": (0, 1, 2),
+    "LOADRES": (2, 4),
+    "STORECON": (2, 3, 5),
+    "AMO": (3, 4, 6),
+    "CSR": (1, 2),
+}
+
+# constructors with an immediate form, selected by a bool field: maps the
+# constructor name to (index of the bool field, the register-index fields of
+# the immediate form). in csrrwi, csrrsi and csrrci the rs1 field is a 5 bit
+# immediate (uimm), only rd is a register
+IMMEDIATE_FORMS = {
+    "CSR": (3, (2,)),
+}
+
+
+class _Constructor:
+    """A union constructor that programs are generated from."""
+
+    def __init__(
+        self,
+        machine,
+        strategies,
+        name: str,
+        typ,
+        register_width: int,
+        register_fields: dict,
+        immediate_forms: dict = None,
+    ):
+        self.name = name
+        self.builder = constructor_builder(machine, name, typ)
+        self.is_tuple = sailtype_kind(typ) == "Tuple"
+        self.fields = list(typ) if self.is_tuple else [typ]
+        # the listed register-index fields that are bitvectors of register_width bits
+        self.register_fields = frozenset(
+            index
+            for index in register_fields.get(name, ())
+            if self._is_register_field(index, register_width)
+        )
+        # (index of the bool field, register fields if it is true) or None
+        self.immediate_form = None
+        flag_index, immediate_fields = (immediate_forms or {}).get(name, (None, ()))
+        if (
+            flag_index is not None
+            and flag_index < len(self.fields)
+            and sailtype_kind(self.fields[flag_index]) == "Bool"
+        ):
+            self.immediate_form = (
+                flag_index,
+                self.register_fields.intersection(immediate_fields),
+            )
+        self._strategies = strategies
+        self._field_strategies = None
+
+    def _is_register_field(self, index: int, register_width: int) -> bool:
+        return (
+            index < len(self.fields)
+            and sailtype_kind(self.fields[index]) == "SmallFixedBitVector"
+            and self.fields[index].width == register_width
+        )
+
+    def field_strategies(self) -> list:
+        if self._field_strategies is None:
+            self._field_strategies = [
+                self._strategies.hypothesis_from_pydrofoil_type(fieldtyp)
+                for fieldtyp in self.fields
+            ]
+        return self._field_strategies
+
+
+def programs(
+    machine: _pydrofoil.RISCV64,
+    min_size: int = 1,
+    max_size: int = 20,
+    weights: dict = None,
+    default_weight: int = 1,
+    max_registers: int = 4,
+    register_width: int = 5,
+    strategies=None,
+    typ=None,
+    register_fields: dict = None,
+    immediate_forms: dict = None,
+):
+    """Hypothesis strategy generating lists of instructions.
+
+    The register-index fields (rd, rs1, rs2) of the instructions are biased
+    towards a small pool of registers drawn per program, so that the
+    instructions of a program read the values that earlier instructions wrote.
+
+    Args:
+        machine: Instance of _pydrofoil.RISCV64()
+        min_size (int): Minimum number of instructions.
+        max_size (int): Maximum number of instructions.
+        weights (dict[str, int]): Relative weights of constructors, e.g. {"ITYPE": 10}.
+            Constructors with weight 0 are never generated.
+        default_weight (int): Weight of constructors not in weights.
+        max_registers (int): Size of the register pool per program, 0 disables the register bias.
+        register_width (int): Width of the register-index fields.
+        strategies: The BasePydrofoilStrategies used for the fields, defaults to strategies_for_machine(machine).
+        typ: The union type of the instructions, defaults to ast.
+        register_fields (dict[str, tuple[int]]): Maps constructor names to the
+            indices of their register-index fields, defaults to REGISTER_FIELDS.
+        immediate_forms (dict[str, tuple]): Maps constructor names to the index of
+            the bool field selecting their immediate form and the register-index
+            fields of that form, defaults to IMMEDIATE_FORMS.
+    """
+    if strategies is None:
+        strategies = strategies_for_machine(machine)
+    if typ is None:
+        typ = machine.types.ast.sail_type
+    if weights is None:
+        weights = {}
+    if register_fields is None:
+        register_fields = REGISTER_FIELDS
+    if immediate_forms is None:
+        immediate_forms = IMMEDIATE_FORMS
+    names = [name for (name, constructor_typ) in typ.constructors]
+    for name in weights:
+        assert name in names, f"{name} is not a constructor of {typ.name}"
+    constructors = []
+    cumulative_weights = []
+    total = 0
+    for name, constructor_typ in typ.constructors:
+        weight = weights.get(name, default_weight)
+        if weight <= 0:
+            continue
+        total += weight
+        constructors.append(
+            _Constructor(
+                machine,
+                strategies,
+                name,
+                constructor_typ,
+                register_width,
+                register_fields,
+                immediate_forms,
+            )
+        )
+        cumulative_weights.append(total)
+    assert constructors, "all constructors have weight 0"
+    constructor_strategy = st.integers(0, total - 1).map(
+        lambda value: constructors[bisect.bisect_right(cumulative_weights, value)]
+    )
+    return _gen_program(
+        constructor_strategy, min_size, max_size, max_registers, register_width
+    )
+
+
+@st.composite
+def _gen_program(
+    draw: DrawFn,
+    constructor_strategy,
+    min_size: int,
+    max_size: int,
+    max_registers: int,
+    register_width: int,
+) -> list:
+    pool = None
+    if max_registers > 0:
+        pool = draw(
+            st.lists(
+                st.integers(0, 2 ** register_width - 1),
+                min_size=1,
+                max_size=max_registers,
+                unique=True,
+            )
+        )
+        pool = st.sampled_from(
+            [_bitvector(register_width, register) for register in pool]
+        )
+    return draw(
+        st.lists(
+            _gen_instruction(constructor_strategy, pool),
+            min_size=min_size,
+            max_size=max_size,
+        )
+    )
+
+
+@st.composite
+def _gen_instruction(draw: DrawFn, constructor_strategy, pool):
+    constructor = draw(constructor_strategy)
+    strategies = constructor.field_strategies()
+    register_fields = constructor.register_fields
+    flag_index = None
+    if constructor.immediate_form is not None:
+        # the immediate form decides which fields are registers, draw it first
+        flag_index, immediate_fields = constructor.immediate_form
+        flag = draw(strategies[flag_index])
+        if flag:
+            register_fields = immediate_fields
+    values = []
+    for index, strategy in enumerate(strategies):
+        if index == flag_index:
+            values.append(flag)
+            continue
+        if pool is not None and index in register_fields:
+            # shrinks towards reusing the registers of the pool
+            if not draw(st.booleans()):
+                strategy = pool
+        values.append(draw(strategy))
+    value = tuple(values) if constructor.is_tuple else values[0]
+    return constructor.builder(value)
+
+
+class ProgramResult:
+    """The result of execute_program.
+
+    Attributes:
+        statuses (list): The result of execute for every executed instruction.
+        failed_index (int): Index of the first instruction that did not retire
+            successfully, or None.
+    """
+
+    def __init__(self, statuses: list, failed_index: int = None):
+        self.statuses = statuses
+        self.failed_index = failed_index
+
+    @property
+    def succeeded(self) -> bool:
+        """True if all instructions retired successfully."""
+        return self.failed_index is None
+
+    def __repr__(self):
+        return f"ProgramResult({self.statuses!r}, failed_index={self.failed_index!r})"
+
+
+def execute_program(
+    machine: _pydrofoil.RISCV64, program: list, success="RETIRE_SUCCESS"
+) -> ProgramResult:
+    """Executes the instructions of program with machine.lowlevel.execute.
+
+    Stops at the first instruction whose result is not success.
+
+    Args:
+        machine: Instance of _pydrofoil.RISCV64()
+        program (list): The instructions.
+        success: The result of execute for successfully retired instructions.
+    """
+    execute = machine.lowlevel.execute
+    statuses = []
+    append = statuses.append
+    for index, instruction in enumerate(program):
+        status = execute(instruction)
+        append(status)
+        if status != success:
+            return ProgramResult(statuses, index)
+    return ProgramResult(statuses)
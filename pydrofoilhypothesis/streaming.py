@@ -0,0 +1,367 @@
+import random
+
+import _pydrofoil
+from hypothesis.errors import StopTest, UnsatisfiedAssumption
+from hypothesis.internal.conjecture.data import ConjectureData
+from hypothesis.strategies import SearchStrategy
+
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    BasePydrofoilStrategies,
+    _bitvector,
+    _copy_mutable,
+    constructor_builder,
+    register_plan,
+    sailtype_kind,
+    strategies_for_machine,
+)
+
+
+class RejectedDrawError(Exception):
+    """Raised when a customized hook keeps rejecting the values it draws."""
+
+
+def _draw_from_random(strategy, random):
+    """Draws a value from a Hypothesis strategy, with random as the source of randomness.
+
+    This is the only use of Hypothesis internals in this module: ConjectureData
+    and its random argument are private API (tested with Hypothesis 6.169) and
+    may change in other versions. Raises StopTest if the strategy rejects the
+    drawn value, e.g. with .filter().
+    """
+    return ConjectureData(random=random).draw(strategy)
+
+
+class _Sampler(SearchStrategy):
+    """A value generator driven by the PRNG of a StreamingGenerator.
+
+    It is passed to customized gen_* hooks in place of the Hypothesis strategy
+    they get normally. Being a SearchStrategy, hooks can also wrap it into
+    other strategies like st.lists.
+    """
+
+    def __init__(self, sample):
+        super().__init__()
+        self.sample = sample
+
+    def do_draw(self, data):
+        return self.sample()
+
+    def calc_is_empty(self, recur):
+        return False
+
+    def __repr__(self):
+        return "_Sampler()"
+
+
+class StreamingGenerator:
+    """Generates pydrofoil values from a seeded PRNG instead of through Hypothesis.
+
+    There is no shrinking, no example database and no health checks, so this
+    is much faster than drawing from Hypothesis strategies, e.g. for soak
+    testing. The same type dispatch and the customization hooks of the given
+    BasePydrofoilStrategies (gen_*, struct_*, union_*) are used. Values of
+    types whose hooks are not customized are generated directly from the
+    PRNG; customized hooks are called with a draw function that draws from
+    the PRNG too.
+    """
+
+    # upper bounds for the length of generated Vec lists and strings
+    max_vec_length = 10
+    max_string_length = 10
+    # upper bound for the attempts of a customized hook to generate a value
+    max_attempts = 100
+
+    def __init__(self, strategies, seed=None):
+        """Initialize the generator.
+
+        Args:
+            strategies: A BasePydrofoilStrategies instance whose hooks are used, or a
+                machine, which uses the machine's shared instance.
+            seed: Seed of the PRNG, the same seed generates the same values.
+        """
+        if not isinstance(strategies, BasePydrofoilStrategies):
+            strategies = strategies_for_machine(strategies)
+        self.strategies = strategies
+        self.machine = strategies.machine
+        self.random = random.Random(seed)
+        # maps sail types to their samplers
+        self._samplers = {}
+
+    def generate(self, typ, count: int = None):
+        """Yields random values of typ, count many or forever."""
+        sample = self.sampler(typ)
+        if count is None:
+            while True:
+                yield sample()
+        for i in range(count):
+            yield sample()
+
+    def generate_register_values(
+        self,
+        include_registers: list,
+        always_default_registers: list,
+        optional_probability: float = 0.1,
+        count: int = None,
+    ):
+        """Yields dictionaries mapping all register names to values, like random_register_values.
+
+        Every register that is neither in include_registers nor in
+        always_default_registers gets a random value with probability
+        optional_probability.
+        """
+        plan = register_plan(self.machine, include_registers, always_default_registers)
+        rnd = self.random.random
+        entries = [
+            (
+                name,
+                name in plan.random_registers,
+                name in plan.strategies,
+                self.sampler(plan.register_types[name])
+                if name in plan.strategies
+                else None,
+                plan.defaults[name],
+                name in plan.fresh_defaults,
+            )
+            for name in plan.names
+        ]
+        index = 0
+        while count is None or index < count:
+            index += 1
+            values = {}
+            for name, always_random, may_be_random, sample, default, fresh in entries:
+                if always_random or (may_be_random and rnd() < optional_probability):
+                    values[name] = sample()
+                elif fresh:
+                    values[name] = plan.default_value(name)
+                else:
+                    values[name] = _copy_mutable(default)
+            yield values
+
+    def draw(self, strategy):
+        """The draw function passed to customized hooks."""
+        if isinstance(strategy, _Sampler):
+            return strategy.sample()
+        # a strategy built by the hook itself
+        return _draw_from_random(strategy, self.random)
+
+    def sampler(self, typ):
+        """Returns a function without arguments returning a random value of typ."""
+        try:
+            return self._samplers[typ]
+        except KeyError:
+            pass
+        kind = sailtype_kind(typ)
+        meth = getattr(self, f"_sampler_{kind}", None)
+        if meth is None:
+            # kind registered by the user with register_sailtype_kind
+            sample = self._hypothesis_sampler(typ)
+        else:
+            sample = meth(typ)
+        self._samplers[typ] = sample
+        return sample
+
+    # _____________________________________________________
+    # helpers
+
+    def _customized(self, hook: str) -> bool:
+        """Returns whether the strategies class overrides the given gen_* hook."""
+        return getattr(type(self.strategies), hook) is not getattr(
+            BasePydrofoilStrategies, hook
+        )
+
+    def _wrapped(self, typ) -> _Sampler:
+        return _Sampler(self.sampler(typ))
+
+    def _lazy(self, typ) -> _Sampler:
+        sample = None
+
+        def lazy_sample():
+            nonlocal sample
+            if sample is None:
+                sample = self.sampler(typ)
+            return sample()
+
+        return _Sampler(lazy_sample)
+
+    def _hypothesis_sampler(self, typ):
+        strategy = self.strategies.hypothesis_from_pydrofoil_type(typ)
+        draw = self.draw
+        return self._retrying(lambda: draw(strategy))
+
+    def _retrying(self, sample):
+        """Wraps a sampler calling a customized hook, retrying when the hook
+        rejects the values it drew (with .filter() or assume)."""
+        max_attempts = self.max_attempts
+
+        def retrying_sample():
+            for attempt in range(max_attempts):
+                try:
+                    return sample()
+                except (StopTest, UnsatisfiedAssumption):
+                    pass
+            raise RejectedDrawError(
+                f"a customized hook rejected {max_attempts} values in a row, "
+                "its .filter() or assume() is too strict for StreamingGenerator"
+            )
+
+        return retrying_sample
+
+    # _____________________________________________________
+    # samplers, one per kind of sail type
+
+    def _sampler_SmallFixedBitVector(self, typ):
+        if self._customized("gen_bitvector"):
+            return self._retrying(lambda: self.strategies.gen_bitvector(self.draw, typ))
+        width = typ.width
+        getrandbits = self.random.getrandbits
+        return lambda: _pydrofoil.bitvector(width, getrandbits(width))
+
+    def _sampler_BigFixedBitVector(self, typ):
+        if self._customized("gen_bigbitvector"):
+            return self._retrying(
+                lambda: self.strategies.gen_bigbitvector(self.draw, typ)
+            )
+        width = typ.width
+        getrandbits = self.random.getrandbits
+        return lambda: _bitvector(width, getrandbits(width))
+
+    def _sampler_FVec(self, typ):
+        if self._customized("gen_FVec"):
+            return self._retrying(
+                lambda: self.strategies.gen_FVec(self.draw, typ, self.machine)
+            )
+        sample = self.sampler(typ.of)
+        length = typ.length
+        return lambda: [sample() for i in range(length)]
+
+    def _sampler_Bool(self, typ):
+        if self._customized("gen_bool"):
+            return self._retrying(lambda: self.strategies.gen_bool(self.draw))
+        getrandbits = self.random.getrandbits
+        return lambda: getrandbits(1) == 1
+
+    def _sampler_MachineInt(self, typ):
+        if self._customized("gen_MachineInt"):
+            return self._retrying(lambda: self.strategies.gen_MachineInt(self.draw))
+        randint = self.random.randint
+        # same range as BasePydrofoilStrategies.gen_MachineInt
+        return lambda: randint(-2 * 63, 2 * 63 - 1)
+
+    def _sampler_Int(self, typ):
+        if self._customized("gen_Int"):
+            return self._retrying(lambda: self.strategies.gen_Int(self.draw))
+        randint = self.random.randint
+        # same range as BasePydrofoilStrategies.gen_Int
+        return lambda: randint(-2 * 63, 2 * 63 - 1)
+
+    def _sampler_String(self, typ):
+        if self._customized("gen_String"):
+            return self._retrying(lambda: self.strategies.gen_String(self.draw))
+        randrange = self.random.randrange
+        max_length = self.max_string_length
+        return lambda: "".join(
+            chr(randrange(128)) for i in range(randrange(max_length + 1))
+        )
+
+    def _sampler_Enum(self, typ):
+        if self._customized("gen_Enum"):
+            return self._retrying(lambda: self.strategies.gen_Enum(self.draw, typ))
+        elements = list(typ.elements)
+        choice = self.random.choice
+        return lambda: choice(elements)
+
+    def _sampler_Tuple(self, typ):
+        if self._customized("gen_Tuple"):
+            samplers = [self._wrapped(elementtyp) for elementtyp in typ]
+            return self._retrying(
+                lambda: self.strategies.gen_Tuple(self.draw, samplers)
+            )
+        samplers = [self.sampler(elementtyp) for elementtyp in typ]
+        return lambda: tuple([sample() for sample in samplers])
+
+    def _sampler_Struct(self, typ):
+        meth = getattr(self.strategies, f"struct_{typ.name}", None)
+        if meth is not None:
+            return self._retrying(lambda: meth(self.draw, typ))
+        if len(typ.fields) == 1:
+            return self.sampler(typ.fields[0][1])
+        if self._customized("gen_Struct"):
+            samplers = [self._wrapped(fieldtyp) for (name, fieldtyp) in typ.fields]
+            return self._retrying(
+                lambda: self.strategies.gen_Struct(
+                    self.draw, typ.name, samplers, self.machine
+                )
+            )
+        cls = getattr(self.machine.types, typ.name)
+        samplers = [self.sampler(fieldtyp) for (name, fieldtyp) in typ.fields]
+        return lambda: cls(*[sample() for sample in samplers])
+
+    def _sampler_Union(self, typ):
+        meth = getattr(self.strategies, f"union_{typ.name}", None)
+        if meth is not None:
+            return self._retrying(lambda: meth(self.draw, typ))
+        classes = [cls for (cls, constructor_typ) in typ.constructors]
+        samplers = [
+            self._lazy(constructor_typ) for (cls, constructor_typ) in typ.constructors
+        ]
+        if self._customized("gen_Union"):
+            for cls, constructor_typ in typ.constructors:
+                constructor_builder(self.machine, cls, constructor_typ)
+            return self._retrying(
+                lambda: self.strategies.gen_Union(
+                    self.draw, classes, samplers, self.machine
+                )
+            )
+        builders = [
+            constructor_builder(self.machine, cls, constructor_typ)
+            for (cls, constructor_typ) in typ.constructors
+        ]
+        choices = list(zip(builders, samplers))
+        choice = self.random.choice
+
+        def sample_union():
+            builder, sampler = choice(choices)
+            return builder(sampler.sample())
+
+        return sample_union
+
+    def _sampler_Vec(self, typ):
+        if self._customized("gen_Vec"):
+            sampler = self._wrapped(typ.of)
+            return self._retrying(lambda: self.strategies.gen_Vec(self.draw, sampler))
+        sample = self.sampler(typ.of)
+        randrange = self.random.randrange
+        max_length = self.max_vec_length
+        return lambda: [sample() for i in range(randrange(max_length + 1))]
+
+    def _sampler_Unit(self, typ):
+        if self._customized("gen_Unit"):
+            return self._retrying(lambda: self.strategies.gen_Unit(self.draw))
+        return lambda: ()
+
+    def _sampler_GenericBitVector(self, typ):
+        if self._customized("gen_genericbitvector"):
+            return self._retrying(
+                lambda: self.strategies.gen_genericbitvector(self.draw)
+            )
+        randint = self.random.randint
+        getrandbits = self.random.getrandbits
+        max_width = self.strategies.max_genericbitvector_width
+
+        def sample_genericbitvector():
+            width = randint(0, max_width)
+            return _bitvector(width, getrandbits(width))
+
+        return sample_genericbitvector
+
+
+def generate_values(typ, strategies, seed=None, count: int = None):
+    """Yields random values of typ lazily, generated by a StreamingGenerator.
+
+    Args:
+        typ: A pydrofoil type (e.g. Struct, Union, BitVector).
+        strategies: A machine, or a BasePydrofoilStrategies instance whose hooks are used.
+        seed: Seed of the PRNG, the same seed yields the same values.
+        count (int): Number of values to yield, infinitely many if None.
+    """
+    return StreamingGenerator(strategies, seed).generate(typ, count)
@@ -0,0 +1,59 @@
+import pytest
+from pydrofoilhypothesis import pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given
+
+numpy = pytest.importorskip("numpy")
+from pydrofoilhypothesis import batch
+
+m = _pydrofoil.RISCV64()
+registers = dict(m.register_info())
+x_registers = [f"x{i}" for i in range(1, 32)]
+bigBitvetortyp = m.lowlevel.wV.sail_type.arguments[1]
+
+
+def test_random_bitvectors():
+    values = batch.random_bitvectors(registers["x1"], 100, rng=0)
+    assert len(values) == 100
+    assert all(isinstance(value, _pydrofoil.bitvector) for value in values)
+    assert all(len(value) == 64 for value in values)
+    assert values == batch.random_bitvectors(registers["x1"], 100, rng=0)
+
+
+def test_random_bitvectors_narrow_and_wide():
+    for width in (1, 12, 65, bigBitvetortyp.width):
+        for value in batch.random_bitvectors(width, 50, rng=1):
+            assert len(value) == width
+            assert 0 <= value.unsigned() < 2 ** width
+
+
+def test_random_bitvectors_raw():
+    values = batch.random_bitvectors(12, 10, rng=2, raw=True)
+    assert values.words.dtype == numpy.uint64
+    assert values.words.shape == (10, 1)
+    assert int(values.words.max()) < 2 ** 12
+    assert values[3].unsigned() == int(values.words[3, 0])
+    assert values.tolist() == list(values)
+
+
+@given(batch.bitvector_batches(bigBitvetortyp, 4))
+def test_bitvector_batches(values):
+    assert len(values) == 4
+    assert all(len(value) == bigBitvetortyp.width for value in values)
+
+
+@given(batch.register_batches(m, x_registers))
+def test_register_batches(values):
+    assert list(values) == x_registers
+    for name, value in values.items():
+        assert len(value) == 64
+
+
+def test_bitvectors_from_bytes():
+    data = bytes(range(16))
+    values = pydrofoilhypothesis.bitvectors_from_bytes(12, 8, data)
+    assert values[0].unsigned() == 0x100
+    assert values[1].unsigned() == 0x302
+    wide = pydrofoilhypothesis.bitvectors_from_bytes(128, 1, data)[0]
+    assert wide.unsigned() == int.from_bytes(data, "little")
@@ -0,0 +1,59 @@
+import json
+
+import pytest
+from pydrofoilhypothesis import benchmark, pydrofoilhypothesis
+import _pydrofoil
+
+m = _pydrofoil.RISCV64()
+
+
+def test_run_benchmarks():
+    results = benchmark.run_benchmarks(m, examples=5, repeat=1)
+    json.dumps(results)
+    names = [result["name"] for result in results["results"]]
+    assert "Union ast" in names
+    assert "random_register_values" in names
+    assert "default_value register_info" in names
+    for result in results["results"]:
+        assert result["examples"] > 0
+        assert result["seconds"] >= 0
+
+
+def test_main_writes_json(tmp_path):
+    output = tmp_path / "bench.json"
+    benchmark.main(["--examples", "2", "--repeat", "1", "--output", str(output)])
+    assert json.loads(output.read_text())["results"]
+
+
+def test_default_value_benchmark_is_uncached(monkeypatch):
+    x1typ = dict(m.register_info())["x1"]
+    kind = pydrofoilhypothesis.sailtype_kind(x1typ)
+    builder = pydrofoilhypothesis._default_builders[kind]
+    computed = []
+
+    def counting_builder(typ, machine):
+        computed.append(typ)
+        return builder(typ, machine)
+
+    monkeypatch.setitem(pydrofoilhypothesis._default_builders, kind, counting_builder)
+    benchmark.run_benchmarks(m, examples=1, repeat=2)
+    assert computed.count(x1typ) >= 2
+
+
+def test_build_benchmark_is_uncached(monkeypatch):
+    cleared = []
+    clear_machine_cache = pydrofoilhypothesis.clear_machine_cache
+
+    def counting_clear(machine):
+        cleared.append(machine)
+        clear_machine_cache(machine)
+
+    monkeypatch.setattr(pydrofoilhypothesis, "clear_machine_cache", counting_clear)
+    typ = dict(m.register_info())["x1"]
+    benchmark.time_build(m, typ, 3)
+    assert cleared == [m, m, m]
+
+
+def test_benchmark_types_cover_every_kind():
+    kinds = {pydrofoilhypothesis.sailtype_kind(typ) for (name, typ) in benchmark.benchmark_types(m)}
+    assert kinds == set(pydrofoilhypothesis._strategy_builders)
@@ -0,0 +1,118 @@
+import io
+
+import pytest
+from pydrofoilhypothesis import corpus, pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given, settings, strategies as st
+
+m = _pydrofoil.RISCV64()
+asttyp = m.types.ast.sail_type
+registers = dict(m.register_info())
+
+
+def roundtrip(values_and_types):
+    f = io.BytesIO()
+    writer = corpus.CorpusWriter(f, m)
+    for value, typ in values_and_types:
+        if typ is None:
+            writer.write_register_values(value)
+        else:
+            writer.write(value, typ)
+    f.seek(0)
+    return list(corpus.CorpusReader(f, m))
+
+
+def test_varints():
+    for value in (0, 1, 127, 128, 300, 2 ** 70):
+        out = bytearray()
+        corpus._write_varint(out, value)
+        assert corpus._read_varint(out, 0) == (value, len(out))
+    for value in (0, -1, 1, -(2 ** 65), 2 ** 65):
+        out = bytearray()
+        corpus._write_signed(out, value)
+        assert corpus._read_signed(out, 0) == (value, len(out))
+
+
+@settings(max_examples=50)
+@given(st.lists(pydrofoilhypothesis.hypothesis_from_pydrofoil_type(asttyp, m), max_size=5))
+def test_roundtrip_instructions(instructions):
+    assert roundtrip([(instruction, asttyp) for instruction in instructions]) == instructions
+
+
+@settings(max_examples=20)
+@given(pydrofoilhypothesis.random_register_values(m, [name for name in registers], []))
+def test_roundtrip_register_values(values):
+    assert roundtrip([(values, None), (values, None)]) == [values, values]
+
+
+@settings(max_examples=50)
+@given(st.data())
+def test_roundtrip_register_types(data):
+    values_and_types = []
+    for name, typ in m.register_info():
+        strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, m)
+        values_and_types.append((data.draw(strategy), typ))
+    assert roundtrip(values_and_types) == [value for (value, typ) in values_and_types]
+
+
+def test_generated_union_payload():
+    itype = dict(asttyp.constructors)["ITYPE"]
+    payload = (
+        _pydrofoil.bitvector(12, 1),
+        _pydrofoil.bitvector(5, 5),
+        _pydrofoil.bitvector(5, 6),
+        "RISCV_ADDI",
+    )
+    addi = pydrofoilhypothesis.constructor_builder(m, "ITYPE", itype)(payload)
+    assert pydrofoilhypothesis.union_payload(m, addi) is payload
+    assert roundtrip([(addi, asttyp)]) == [addi]
+    default = pydrofoilhypothesis.default_value(asttyp, m)
+    assert roundtrip([(default, asttyp)]) == [default]
+
+
+def test_union_without_argument_getter():
+    addi = m.types.ITYPE(
+        _pydrofoil.bitvector(12, 1),
+        _pydrofoil.bitvector(5, 5),
+        _pydrofoil.bitvector(5, 6),
+        "RISCV_ADDI",
+    )
+    writer = corpus.CorpusWriter(io.BytesIO(), m)
+    with pytest.raises(corpus.UnionArgumentsError):
+        writer.write(addi, asttyp)
+
+
+def test_register_union_argument_getter(monkeypatch):
+    monkeypatch.setattr(corpus, "_union_argument_getter", None)
+    instruction = m.types.ILLEGAL(_pydrofoil.bitvector(32, 7))
+    arguments = {id(instruction): (_pydrofoil.bitvector(32, 7),)}
+    corpus.register_union_argument_getter(lambda value: arguments[id(value)])
+    f = io.BytesIO()
+    corpus.CorpusWriter(f, m).write(instruction, asttyp)
+    f.seek(0)
+    assert list(corpus.CorpusReader(f, m)) == [instruction]
+
+
+def test_bad_header():
+    with pytest.raises(corpus.CorpusFormatError):
+        corpus.CorpusReader(io.BytesIO(b"nope!"), m)
+    with pytest.raises(corpus.CorpusFormatError):
+        corpus.CorpusReader(io.BytesIO(corpus.MAGIC + bytes([99])), m)
+
+
+def test_truncated_record():
+    f = io.BytesIO()
+    corpus.CorpusWriter(f, m).write(_pydrofoil.bitvector(64, 5), registers["x1"])
+    reader = corpus.CorpusReader(io.BytesIO(f.getvalue()[:-1]), m)
+    with pytest.raises(corpus.CorpusFormatError):
+        list(reader)
+
+
+def test_write_read_corpus_file(tmp_path):
+    path = str(tmp_path / "corpus.bin")
+    values = [_pydrofoil.bitvector(64, i) for i in range(1000)]
+    assert corpus.write_corpus(path, m, values, registers["x1"]) == 1000
+    assert list(corpus.read_corpus(path, m)) == values
+    # one byte of record length, one of kind, one of type id and 8 of value
+    assert (tmp_path / "corpus.bin").stat().st_size < 1000 * 12 + 100
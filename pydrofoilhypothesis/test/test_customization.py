@@ -241,3 +241,22 @@ def test_generate_Struct(val):
     assert val.high in (False, True)
     assert val.signed_rs1 in (False, True)
     assert val.signed_rs2 in (False, True)
+
+
+# _____________________________________________________
+
+
+class PydrofoilStrategies2(pydrofoilhypothesis.BasePydrofoilStrategies):
+    def gen_bool(self, draw):
+        return True
+
+
+structtyp = m.lowlevel.encdec_mul_op_backwards.sail_type.result
+structstrategy = PydrofoilStrategies2(m).hypothesis_from_pydrofoil_type(structtyp)
+
+
+@given(structstrategy)
+def test_nested_types_use_customization(val):
+    assert val.high is True
+    assert val.signed_rs1 is True
+    assert val.signed_rs2 is True
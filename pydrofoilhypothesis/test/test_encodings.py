@@ -0,0 +1,49 @@
+import pytest
+from pydrofoilhypothesis import encodings
+import _pydrofoil
+
+from hypothesis import given, settings
+
+m = _pydrofoil.RISCV64()
+
+
+def test_deposit():
+    assert encodings._deposit(0b101, 0b111000) == 0b101000
+    assert encodings._deposit(0b11, 0b1001) == 0b1001
+    assert encodings._deposit(0, 0xFF) == 0
+
+
+def test_valid_patterns_are_cached():
+    patterns = encodings.valid_patterns(m)
+    assert encodings.valid_patterns(m) is patterns
+    keys = patterns.keys(0x13)
+    assert keys
+    assert patterns.keys(0x13) is keys
+    for key, example in keys:
+        assert example & encodings.RV32.opcode_mask == 0x13
+        assert example & encodings.RV32.key_mask == key
+        assert patterns.is_valid(patterns.decode(example))
+
+
+@settings(max_examples=50)
+@given(encodings.valid_encodings(m, compressed=False))
+def test_valid_encodings(pair):
+    encoding, instruction = pair
+    assert len(encoding) == 32
+    assert instruction.__class__.__name__ != "ILLEGAL"
+    assert m.lowlevel.encdec_backwards(encoding) == instruction
+
+
+@settings(max_examples=50)
+@given(encodings.valid_instructions(m, compressed=False))
+def test_valid_instructions(instruction):
+    assert isinstance(instruction, m.types.ast)
+    assert instruction.__class__.__name__ != "ILLEGAL"
+
+
+@settings(max_examples=50)
+@given(encodings.valid_encodings(m, compressed=False))
+def test_roundtrip(pair):
+    encoding, instruction = pair
+    reencoded = encodings.check_roundtrip(m, encoding)
+    assert m.lowlevel.encdec_backwards(reencoded) == instruction
@@ -0,0 +1,99 @@
+import pytest
+from pydrofoilhypothesis import enumeration
+import _pydrofoil
+
+m = _pydrofoil.RISCV64()
+registers = dict(m.register_info())
+itype_typ = dict(m.types.ast.sail_type.constructors)["ITYPE"]
+immediate_typ, register_index_typ, _, iop_typ = list(itype_typ)
+
+
+def test_domain_sizes():
+    assert enumeration.domain_size(registers["x1"], m) == 2 ** 64
+    assert enumeration.domain_size(registers["flag"], m) == 2
+    assert enumeration.domain_size(iop_typ, m) == len(iop_typ.elements)
+    assert enumeration.domain_size(itype_typ, m) == 2 ** 12 * 32 * 32 * len(
+        iop_typ.elements
+    )
+    assert enumeration.domain_size(registers["vlist"], m) is None
+    with pytest.raises(enumeration.UnboundedDomain):
+        enumeration.domain(registers["vlist"], m)
+
+
+def test_enumerate_tuple():
+    itype_domain = enumeration.domain(itype_typ, m)
+    zero5 = _pydrofoil.bitvector(5, 0)
+    elements = iop_typ.elements
+    assert itype_domain.value(0) == (_pydrofoil.bitvector(12, 0), zero5, zero5, elements[0])
+    assert itype_domain.value(1) == (_pydrofoil.bitvector(12, 0), zero5, zero5, elements[1])
+    assert itype_domain.value(len(elements)) == (
+        _pydrofoil.bitvector(12, 0),
+        zero5,
+        _pydrofoil.bitvector(5, 1),
+        elements[0],
+    )
+    assert itype_domain.value(itype_domain.size - 1) == (
+        _pydrofoil.bitvector(12, 2 ** 12 - 1),
+        _pydrofoil.bitvector(5, 31),
+        _pydrofoil.bitvector(5, 31),
+        elements[-1],
+    )
+
+
+def test_enumerate_values():
+    values = list(enumeration.enumerate_values(register_index_typ, m))
+    assert values == [_pydrofoil.bitvector(5, i) for i in range(32)]
+    assert list(enumeration.enumerate_values(iop_typ, m)) == list(iop_typ.elements)
+
+
+def test_enumerate_union():
+    itype_domain = enumeration.domain(itype_typ, m)
+    ast_domain = enumeration.domain(m.types.ast.sail_type, m)
+    first = ast_domain.value(0)
+    assert isinstance(first, m.types.ITYPE)
+    assert isinstance(ast_domain.value(itype_domain.size), m.types.ast)
+    assert not isinstance(ast_domain.value(itype_domain.size), m.types.ITYPE)
+
+
+def test_budget():
+    with pytest.raises(ValueError):
+        enumeration.enumerate_values(itype_typ, m, budget=1000)
+
+
+def test_shards_cover_domain():
+    typ = immediate_typ
+    values = list(enumeration.enumerate_values(typ, m))
+    sharded = []
+    for shard in range(5):
+        sharded.extend(enumeration.enumerate_values(typ, m, shard=shard, shards=5))
+    assert sharded == values
+
+
+def test_values_match_value():
+    ast_domain = enumeration.domain(m.types.ast.sail_type, m)
+    itype_domain = enumeration.domain(itype_typ, m)
+    start = itype_domain.size - 3
+    values = list(ast_domain.values(start, start + 6))
+    assert values == [ast_domain.value(index) for index in range(start, start + 6)]
+    values = list(itype_domain.values(1000, 1010))
+    assert values == [itype_domain.value(index) for index in range(1000, 1010)]
+
+
+def test_product_values_from_any_start():
+    mul_typ = dict(m.types.ast.sail_type.constructors)["MUL"]
+    mul_domain = enumeration.domain(mul_typ, m)
+    indices = [0, 1, 7, 8, 255, 256, 1000, mul_domain.size - 300, mul_domain.size - 1]
+    for start in indices:
+        # the last starts also check stops past the end of the domain
+        for stop in (start, start + 1, start + 300):
+            values = list(mul_domain.values(start, stop))
+            expected = range(start, min(stop, mul_domain.size))
+            assert values == [mul_domain.value(index) for index in expected]
+    assert list(mul_domain.values(mul_domain.size)) == []
+
+
+def test_last_shard_starts_without_enumerating_earlier_values():
+    itype_domain = enumeration.domain(itype_typ, m)
+    values = enumeration.enumerate_values(itype_typ, m, shard=999, shards=1000)
+    start, stop = enumeration.shard_range(itype_domain.size, 999, 1000)
+    assert next(iter(values)) == itype_domain.value(start)
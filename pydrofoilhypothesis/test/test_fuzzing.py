@@ -0,0 +1,123 @@
+import os
+import time
+
+import pytest
+from pydrofoilhypothesis import fuzzing, machinestate
+import _pydrofoil
+
+m = _pydrofoil.RISCV64()
+
+
+def broken(instruction):
+    raise ValueError("broken")
+
+
+def crash(instruction):
+    os._exit(3)
+
+
+def hang(instruction):
+    time.sleep(60)
+
+
+for function in (broken, crash, hang):
+    function.sail_type = m.lowlevel.execute.sail_type
+
+
+class BrokenLowlevel:
+    def __init__(self, machine):
+        self.machine = machine
+        self.broken = broken
+        self.crash = crash
+        self.hang = hang
+
+    def __getattr__(self, name):
+        return getattr(self.machine.lowlevel, name)
+
+
+class BrokenMachine:
+    """A machine with the additional lowlevel functions broken, crash and hang."""
+
+    def __init__(self):
+        self.machine = _pydrofoil.RISCV64()
+        self.lowlevel = BrokenLowlevel(self.machine)
+
+    def __getattr__(self, name):
+        return getattr(self.machine, name)
+
+
+def test_lowlevel_functions():
+    names = fuzzing.lowlevel_functions(m)
+    assert "execute" in names
+    assert "encdec_backwards" in names
+
+
+def test_result_matches():
+    registers = dict(m.register_info())
+    assert fuzzing.result_matches(_pydrofoil.bitvector(64, 1), registers["x1"], m)
+    assert not fuzzing.result_matches(_pydrofoil.bitvector(32, 1), registers["x1"], m)
+    assert not fuzzing.result_matches(1, registers["x1"], m)
+    assert fuzzing.result_matches("RETIRE_SUCCESS", m.lowlevel.execute.sail_type.result, m)
+    assert not fuzzing.result_matches("nope", m.lowlevel.execute.sail_type.result, m)
+    asttyp = m.types.ast.sail_type
+    instruction = m.lowlevel.encdec_backwards(_pydrofoil.bitvector(32, 0x13))
+    assert fuzzing.result_matches(instruction, asttyp, m)
+
+
+def test_fuzz_function():
+    report = fuzzing.fuzz_function(m, "encdec_backwards", max_calls=50)
+    assert report.status == "ok"
+    assert report.calls == 50
+    assert machinestate.initial_snapshot(m).dirty_registers() == []
+
+
+def test_fuzz_function_reports_exceptions():
+    report = fuzzing.fuzz_function(BrokenMachine(), "broken", max_calls=5)
+    assert report.status == "failed"
+    assert report.exceptions["ValueError"][:2] == [5, "broken"]
+
+
+def test_fuzz_lowlevel():
+    names = ["encdec_backwards", "bool_bit_backwards", "execute"]
+    report = fuzzing.fuzz_lowlevel(names=names, workers=2, time_budget=0.05)
+    assert sorted(report.reports) == sorted(names)
+    assert all(function.calls > 0 for function in report.reports.values())
+    assert fuzzing.FuzzReport.from_json(report.to_json()).timings().keys() == set(names)
+    assert "ok" in report.format_summary()
+
+
+def test_schedule_slowest_first():
+    timings = {"a": 1.0, "b": 3.0}
+    assert fuzzing._schedule(["a", "b", "c"], timings) == ["c", "b", "a"]
+
+
+def test_fuzz_lowlevel_crash_and_timeout():
+    report = fuzzing.fuzz_lowlevel(
+        BrokenMachine,
+        names=["crash", "encdec_backwards", "hang"],
+        workers=1,
+        time_budget=0.05,
+        timeout=1,
+    )
+    assert report.reports["crash"].status == "crashed"
+    assert report.reports["hang"].status == "timeout"
+    assert report.reports["encdec_backwards"].status == "ok"
+    assert [function.name for function in report.failures()] == ["crash", "hang"]
+
+
+def test_fuzz_function_without_restore(monkeypatch):
+    snapshot = machinestate.initial_snapshot(m)
+    restores = []
+    restore = snapshot.restore
+
+    def counting_restore():
+        restores.append(1)
+        return restore()
+
+    monkeypatch.setattr(snapshot, "restore", counting_restore)
+    report = fuzzing.fuzz_function(m, "encdec_backwards", max_calls=50, restore=False)
+    assert report.status == "ok"
+    assert report.calls == 50
+    assert len(restores) == 1
+    fuzzing.fuzz_function(m, "encdec_backwards", max_calls=50)
+    assert len(restores) == 52
@@ -0,0 +1,112 @@
+import pytest
+from pydrofoilhypothesis import machinestate, pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given
+
+pytest_plugins = ["pydrofoilhypothesis.plugin"]
+
+m = _pydrofoil.RISCV64()
+snapshot = machinestate.MachineSnapshot(m)
+
+register_value_typ = dict(m.register_info())["x1"]
+register_value_strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(
+    register_value_typ, m
+)
+
+
+@given(register_value_strategy)
+def test_restore(value):
+    m.write_register("x1", value)
+    dirty = ["x1"] if value != snapshot.values["x1"] else []
+    assert snapshot.dirty_registers() == dirty
+    assert snapshot.restore() == dirty
+    assert m.read_register("x1") == snapshot.values["x1"]
+    assert snapshot.restore() == []
+
+
+@given(register_value_strategy)
+def test_restored_machine(value):
+    with machinestate.restored_machine(m) as machine:
+        machine.write_register("x1", value)
+        assert machine.read_register("x1") == value
+    assert m.read_register("x1") == machinestate.initial_snapshot(m).values["x1"]
+
+
+@pytest.fixture(scope="session")
+def pydrofoil_machine():
+    return m
+
+
+@given(register_value_strategy)
+def test_snapshot_fixture(pydrofoil_snapshot, value):
+    with pydrofoil_snapshot.restored():
+        assert pydrofoil_snapshot.dirty_registers() == []
+        m.lowlevel.wX(1, value)
+    assert m.read_register("x1") == pydrofoil_snapshot.values["x1"]
+
+
+register_values_strategy = pydrofoilhypothesis.random_register_values(
+    m, [], [name for (name, typ) in m.register_info() if "tlb" in name]
+)
+
+
+@given(register_values_strategy)
+def test_apply_register_values(values):
+    with machinestate.restored_machine(m):
+        baseline = machinestate.read_register_values(m)
+        written = machinestate.apply_register_values(m, values, baseline)
+        assert written == [
+            name for (name, value) in values.items() if baseline[name] != value
+        ]
+        assert machinestate.read_register_values(m) == values
+        assert machinestate.apply_register_values(m, values, values) == []
+        assert machinestate.apply_register_values(m, values) == []
+
+
+def test_read_register_values():
+    values = machinestate.read_register_values(m, ["x1", "cur_privilege"])
+    assert list(values) == ["x1", "cur_privilege"]
+    assert values["x1"] == m.read_register("x1")
+    with pytest.raises(Exception):
+        machinestate.apply_register_values(m, {"not_a_register": 0})
+
+
+itype_args = dict(m.types.ast.sail_type.constructors)["ITYPE"]
+itype_args_strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(itype_args, m)
+x_registers = [f"x{i}" for i in range(1, 32)]
+x_diff = machinestate.StateDiff(m, x_registers)
+
+
+@given(itype_args_strategy, register_value_strategy)
+def test_state_diff_itype(args, register_value):
+    immediate, rs, rd, iop = args
+    with machinestate.restored_machine(m):
+        if rs.unsigned():
+            m.lowlevel.wX(rs.unsigned(), register_value)
+        with x_diff:
+            m.lowlevel.execute(m.types.ITYPE(*args))
+        changes = x_diff.assert_only_changed([f"x{rd.unsigned()}"])
+        for name, (old, new) in changes.items():
+            assert new == m.read_register(name)
+
+
+def test_state_diff_reports_unexpected_changes():
+    diff = machinestate.StateDiff(m)
+    with machinestate.restored_machine(m):
+        diff.capture()
+        m.lowlevel.wX(3, _pydrofoil.bitvector(64, 1234))
+        assert diff.changed_registers() == ["x3"]
+        assert diff.changed()["x3"][1] == _pydrofoil.bitvector(64, 1234)
+        with pytest.raises(AssertionError, match="x3"):
+            diff.assert_only_changed(["x4"])
+
+
+def test_pool_close_drops_caches_of_created_machines():
+    pool = machinestate.MachinePool(_pydrofoil.RISCV64, [m])
+    pool.warm(2)
+    created = pool.machines[1]
+    pool.close()
+    assert pool.machines == []
+    assert id(created) not in pydrofoilhypothesis._machine_caches
+    assert id(m) in pydrofoilhypothesis._machine_caches
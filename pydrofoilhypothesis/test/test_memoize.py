@@ -0,0 +1,93 @@
+import pytest
+from pydrofoilhypothesis import memoize, pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given, settings
+
+m = _pydrofoil.RISCV64()
+bit_typ = m.lowlevel.bool_bit_backwards.sail_type.arguments[0]
+
+
+def test_memoized_function():
+    function = memoize.MemoizedFunction(m.lowlevel.bool_bit_backwards)
+    assert function.sail_type is m.lowlevel.bool_bit_backwards.sail_type
+    one = _pydrofoil.bitvector(1, 1)
+    assert function(one) == m.lowlevel.bool_bit_backwards(one)
+    assert function(_pydrofoil.bitvector(1, 1)) == m.lowlevel.bool_bit_backwards(one)
+    assert function(_pydrofoil.bitvector(1, 0)) == m.lowlevel.bool_bit_backwards(
+        _pydrofoil.bitvector(1, 0)
+    )
+    assert function.cache_info() == memoize.CacheInfo(1, 2, 0, memoize.DEFAULT_MAXSIZE, 2)
+    assert function.hit_rate == pytest.approx(1 / 3)
+    function.cache_clear()
+    assert function.cache_info() == memoize.CacheInfo(0, 0, 0, memoize.DEFAULT_MAXSIZE, 0)
+
+
+def test_lru_eviction():
+    calls = []
+
+    def double(value):
+        calls.append(value)
+        return value * 2
+
+    function = memoize.MemoizedFunction(double, maxsize=2)
+    function(1)
+    function(2)
+    function(1)
+    function(3)  # evicts 2
+    function(1)
+    function(2)
+    assert calls == [1, 2, 3, 2]
+    assert function.cache_info().currsize == 2
+
+
+def test_unhashable_arguments_are_not_cached():
+    function = memoize.MemoizedFunction(lambda value: len(value))
+    assert function({1: 2}) == 1
+    assert function({1: 2}) == 1
+    assert function.cache_info().uncached == 2
+
+
+class Mutable:
+    def __init__(self, value):
+        self.value = value
+
+
+def test_identity_hashed_arguments_are_not_cached():
+    function = memoize.MemoizedFunction(lambda argument: argument.value)
+    argument = Mutable(1)
+    assert function(argument) == 1
+    argument.value = 2
+    assert function(argument) == 2
+    assert function.cache_info().uncached == 2
+    function = memoize.MemoizedFunction(lambda arguments: arguments[0].value)
+    assert function((argument,)) == 2
+    assert function.cache_info().uncached == 1
+
+
+def test_identity_hashed_results_are_not_cached():
+    function = memoize.MemoizedFunction(Mutable)
+    result = function(1)
+    result.value = 2
+    assert function(1).value == 1
+    assert function.cache_info() == memoize.CacheInfo(0, 0, 2, memoize.DEFAULT_MAXSIZE, 0)
+
+
+def test_cached_lists_are_copied():
+    function = memoize.MemoizedFunction(lambda value: [value, (value, [value])])
+    function(1)[1][1].append(2)
+    assert function(1) == [1, (1, [1])]
+    assert function.cache_info().hits == 1
+
+
+@settings(max_examples=50)
+@given(pydrofoilhypothesis.hypothesis_from_pydrofoil_type(bit_typ, m))
+def test_memoized_lowlevel(bit):
+    lowlevel = memoize.MemoizedLowlevel(m, ["bool_bit_backwards", "encdec_backwards"])
+    assert lowlevel.bool_bit_backwards(bit) == m.lowlevel.bool_bit_backwards(bit)
+    assert lowlevel.bool_bit_backwards(bit) == m.lowlevel.bool_bit_backwards(bit)
+    assert lowlevel.execute == m.lowlevel.execute
+    stats = lowlevel.stats()
+    assert stats["bool_bit_backwards"].hits == 1
+    assert stats["encdec_backwards"].hits == 0
+    assert "bool_bit_backwards" in lowlevel.format_stats()
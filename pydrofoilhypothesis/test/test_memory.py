@@ -0,0 +1,53 @@
+import pytest
+from pydrofoilhypothesis import memory
+import _pydrofoil
+
+from hypothesis import find, given, settings
+
+
+def test_write_read_across_pages():
+    image = memory.MemoryImage()
+    image.write(4090, bytes(range(1, 13)))
+    assert len(image) == 2
+    assert image.read(4088, 16) == b"\0\0" + bytes(range(1, 13)) + b"\0\0"
+    assert image.read(2 ** 30, 4) == bytes(4)
+    image.write_word(_pydrofoil.bitvector(64, 0x2000), 0x1122334455667788)
+    assert image.read_word(0x2000) == 0x1122334455667788
+    assert image.read(0x2000, 1) == b"\x88"
+
+
+def test_words_and_load():
+    image = memory.MemoryImage()
+    image.write_word(0x3008, 5)
+    image.write_word(0x1000, 7)
+    assert list(image.words()) == [(0x1000, 7), (0x3008, 5)]
+    written = {}
+    assert image.load_words(written.__setitem__) == 2
+    assert written == {0x1000: 7, 0x3008: 5}
+    pages = {}
+    assert image.load(lambda address, data: pages.__setitem__(address, bytes(data))) == 2
+    assert sorted(pages) == [0x1000, 0x3000]
+    assert pages[0x3000] == image.read(0x3000, memory.PAGE_SIZE)
+
+
+def test_satp_page_table_address():
+    satp = _pydrofoil.bitvector(64, (8 << 60) | 0x80123)
+    assert memory.satp_page_table_address(satp) == 0x80123000
+
+
+@settings(max_examples=20)
+@given(memory.memory_images(min_pages=1, max_pages=4))
+def test_memory_images(image):
+    assert 1 <= len(image) <= 4
+    for number, page in image.pages.items():
+        assert len(page) == memory.PAGE_SIZE
+        assert 0 <= number < 2 ** 39 // memory.PAGE_SIZE
+
+
+def test_memory_images_near():
+    root = memory.satp_page_table_address((8 << 60) | 0x80123)
+    image = find(
+        memory.memory_images(min_pages=1, near=[root], near_pages=0),
+        lambda image: root // memory.PAGE_SIZE in image.pages,
+    )
+    assert list(image.pages) == [root // memory.PAGE_SIZE]
@@ -0,0 +1,65 @@
+import pytest
+from pydrofoilhypothesis import parallel, pydrofoilhypothesis
+import _pydrofoil
+
+
+def x1_strategy(machine):
+    typ = dict(machine.register_info())["x1"]
+    return pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, machine)
+
+
+def write_read_x1(machine, value):
+    machine.write_register("x1", value)
+    assert machine.read_register("x1") == value
+
+
+def x1_is_small(machine, value):
+    assert value.unsigned() < 1000
+
+
+def test_run_parallel():
+    parallel.run_parallel(x1_strategy, write_read_x1, workers=2, max_examples=40)
+
+
+def test_run_parallel_failure_is_shrunk_in_parent():
+    with pytest.raises(AssertionError):
+        parallel.run_parallel(x1_strategy, x1_is_small, workers=2, max_examples=200)
+
+
+def register_index_typ(machine):
+    return list(dict(machine.types.ast.sail_type.constructors)["ITYPE"])[1]
+
+
+def register_index_is_small(machine, value):
+    assert value.unsigned() < 20
+
+
+def write_read_x1_index(machine, value):
+    machine.lowlevel.wX(1, _pydrofoil.bitvector(64, value.unsigned()))
+    assert machine.lowlevel.rX(1).unsigned() == value.unsigned()
+
+
+def test_run_exhaustive():
+    assert parallel.run_exhaustive(register_index_typ, write_read_x1_index, workers=2) == 32
+
+
+def test_run_exhaustive_failure():
+    with pytest.raises(AssertionError):
+        parallel.run_exhaustive(register_index_typ, register_index_is_small, workers=2)
+
+
+def x2_starts_at_zero(machine, value):
+    assert machine.read_register("x2").unsigned() == 0
+    machine.write_register("x2", value)
+
+
+def test_run_parallel_resets_machine_between_examples():
+    parallel.run_parallel(x1_strategy, x2_starts_at_zero, workers=2, max_examples=40)
+
+
+def write_x2_index(machine, value):
+    x2_starts_at_zero(machine, _pydrofoil.bitvector(64, value.unsigned() + 1))
+
+
+def test_run_exhaustive_resets_machine_between_values():
+    assert parallel.run_exhaustive(register_index_typ, write_x2_index, workers=2) == 32
@@ -0,0 +1,46 @@
+import pytest
+from pydrofoilhypothesis import machinestate
+import _pydrofoil
+
+from hypothesis import given, settings, strategies as st
+
+pytest_plugins = ["pydrofoilhypothesis.plugin"]
+
+
+def test_pool_machine_is_reset_after_test(request, pydrofoil_machine, pydrofoil_pool):
+    assert pydrofoil_pool.machines[0] is pydrofoil_machine
+    snapshot = machinestate.initial_snapshot(pydrofoil_machine)
+    snapshot.restore()
+    pydrofoil_machine.lowlevel.wX(1, _pydrofoil.bitvector(64, 1234))
+    assert snapshot.dirty_registers() == ["x1"]
+    plugin = request.config.pluginmanager.get_plugin("pydrofoilhypothesis.plugin")
+    plugin.pytest_runtest_teardown(request.node, None)
+    assert snapshot.dirty_registers() == []
+
+
+def test_pool_acquire_release(pydrofoil_pool):
+    with pydrofoil_pool.machine() as machine1:
+        with pydrofoil_pool.machine() as machine2:
+            assert machine1 is not machine2
+            machine2.lowlevel.wX(2, _pydrofoil.bitvector(64, 5))
+        assert machinestate.initial_snapshot(machine2).dirty_registers() == []
+    assert len(pydrofoil_pool.machines) >= 2
+    with pydrofoil_pool.machine() as machine:
+        assert machine in (machine1, machine2)
+
+
+def test_strategy_factory_caches(pydrofoil_strategies):
+    assert pydrofoil_strategies.register("x1") is pydrofoil_strategies.register("x1")
+    assert pydrofoil_strategies.type("ast") is pydrofoil_strategies.type("ast")
+    x1typ = dict(pydrofoil_strategies.machine.register_info())["x1"]
+    assert pydrofoil_strategies(x1typ) is pydrofoil_strategies.register("x1")
+
+
+@settings(max_examples=20)
+@given(data=st.data())
+def test_strategy_factory_draws(pydrofoil_strategies, pydrofoil_machine, data):
+    instruction = data.draw(pydrofoil_strategies.type("ast"))
+    assert isinstance(instruction, pydrofoil_machine.types.ast)
+    rs, value = data.draw(st.tuples(*pydrofoil_strategies.arguments("wX")))
+    values = data.draw(pydrofoil_strategies.registers(["x1"]))
+    assert len(values) == len(pydrofoil_machine.register_info())
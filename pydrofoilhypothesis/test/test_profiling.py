@@ -0,0 +1,78 @@
+import json
+
+import pytest
+from pydrofoilhypothesis import profiling, pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given, settings
+
+m = _pydrofoil.RISCV64()
+profile = profiling.GenerationProfile()
+pst = pydrofoilhypothesis.BasePydrofoilStrategies(m, profile=profile)
+
+structtyp = m.lowlevel.encdec_mul_op_backwards.sail_type.result
+structstrategy = pst.hypothesis_from_pydrofoil_type(structtyp)
+
+
+def test_profile_struct():
+    profile.reset()
+
+    @settings(max_examples=20, database=None)
+    @given(structstrategy)
+    def draw_structs(val):
+        pass
+
+    draw_structs()
+    rows = {(row["type"], row["hook"]): row for row in profile.rows()}
+    struct_row = rows[(structtyp.name, "gen_Struct")]
+    bool_row = rows[("Bool", "gen_bool")]
+    assert struct_row["draws"] >= 1
+    assert bool_row["draws"] == 3 * struct_row["draws"]
+    assert struct_row["seconds"] >= struct_row["self_seconds"]
+    assert struct_row["bytes"] >= bool_row["bytes"] / 3
+    assert json.loads(profile.to_json())
+    assert structtyp.name in profile.format_table()
+
+
+def test_enable_profiling():
+    try:
+        active = profiling.enable_profiling()
+        assert profiling.enable_profiling() is active
+        strategies = pydrofoilhypothesis.BasePydrofoilStrategies(m)
+
+        @settings(max_examples=1, database=None)
+        @given(strategies.hypothesis_from_pydrofoil_type(structtyp))
+        def draw_struct(val):
+            pass
+
+        draw_struct()
+        assert any(row["type"] == structtyp.name for row in active.rows())
+    finally:
+        profiling.disable_profiling()
+    assert profiling.active_profile() is None
+
+
+def test_enable_profiling_after_lookup():
+    strategies = pydrofoilhypothesis.BasePydrofoilStrategies(m)
+    unprofiled = strategies.hypothesis_from_pydrofoil_type(structtyp)
+    try:
+        active = profiling.enable_profiling()
+        profiled = strategies.hypothesis_from_pydrofoil_type(structtyp)
+        assert profiled is not unprofiled
+        assert strategies.hypothesis_from_pydrofoil_type(structtyp) is profiled
+
+        @settings(max_examples=1, database=None)
+        @given(profiled)
+        def draw_struct(val):
+            pass
+
+        draw_struct()
+        assert any(row["type"] == structtyp.name for row in active.rows())
+    finally:
+        profiling.disable_profiling()
+    assert strategies.hypothesis_from_pydrofoil_type(structtyp) is unprofiled
+    try:
+        assert profiling.enable_profiling() is not active
+        assert strategies.hypothesis_from_pydrofoil_type(structtyp) is not profiled
+    finally:
+        profiling.disable_profiling()
@@ -0,0 +1,92 @@
+import pytest
+from pydrofoilhypothesis import machinestate, programs, pydrofoilhypothesis
+import _pydrofoil
+
+from hypothesis import given, settings, strategies as st
+
+m = _pydrofoil.RISCV64()
+
+
+@settings(max_examples=20)
+@given(programs.programs(m, max_size=10))
+def test_programs(program):
+    assert 1 <= len(program) <= 10
+    for instruction in program:
+        assert isinstance(instruction, m.types.ast)
+
+
+@settings(max_examples=20)
+@given(programs.programs(m, weights={"ITYPE": 1}, default_weight=0))
+def test_program_weights(program):
+    for instruction in program:
+        assert isinstance(instruction, m.types.ITYPE)
+
+
+def test_unknown_constructor_weight():
+    with pytest.raises(AssertionError):
+        programs.programs(m, weights={"NOT_A_CONSTRUCTOR": 1})
+
+
+def test_register_fields():
+    constructors = dict(m.types.ast.sail_type.constructors)
+    itype = programs._Constructor(
+        m, None, "ITYPE", constructors["ITYPE"], 5, programs.REGISTER_FIELDS
+    )
+    # immediate, rs, rd, op
+    assert itype.register_fields == {1, 2}
+    unlisted = programs._Constructor(m, None, "ITYPE", constructors["ITYPE"], 5, {})
+    assert unlisted.register_fields == frozenset()
+    assert unlisted.immediate_form is None
+
+
+csr_typ = dict(m.types.ast.sail_type.constructors)["CSR"]
+csr = programs._Constructor(
+    m, None, "CSR", csr_typ, 5, programs.REGISTER_FIELDS, programs.IMMEDIATE_FORMS
+)
+# csr, rs1 or uimm, rd, is_imm, op
+zero, one = _pydrofoil.bitvector(5, 0), _pydrofoil.bitvector(5, 1)
+csr._field_strategies = [
+    pydrofoilhypothesis.hypothesis_from_pydrofoil_type(csr.fields[0], m),
+    st.just(zero),
+    st.just(zero),
+    st.booleans(),
+    pydrofoilhypothesis.hypothesis_from_pydrofoil_type(csr.fields[4], m),
+]
+
+
+def test_csr_immediate_form():
+    assert csr.register_fields == {1, 2}
+    assert csr.immediate_form == (3, {2})
+
+
+@settings(max_examples=50)
+@given(programs._gen_instruction(st.just(csr), st.just(one)))
+def test_csr_immediate_is_not_biased(instruction):
+    uimm_or_rs1, rd, is_imm = pydrofoilhypothesis.union_payload(m, instruction)[1:4]
+    if is_imm:
+        assert uimm_or_rs1 == zero
+
+
+def test_execute_program_stops_at_failure():
+    addi = m.types.ITYPE(
+        _pydrofoil.bitvector(12, 1),
+        _pydrofoil.bitvector(5, 5),
+        _pydrofoil.bitvector(5, 5),
+        "RISCV_ADDI",
+    )
+    illegal = m.types.ILLEGAL(_pydrofoil.bitvector(32, 0))
+    with machinestate.restored_machine(m):
+        result = programs.execute_program(m, [addi, addi, illegal, addi])
+        assert result.statuses == ["RETIRE_SUCCESS", "RETIRE_SUCCESS", "RETIRE_FAIL"]
+        assert result.failed_index == 2
+        assert not result.succeeded
+        assert m.read_register("x5").unsigned() == 2
+
+
+@settings(max_examples=20)
+@given(programs.programs(m, weights={"ITYPE": 1}, default_weight=0))
+def test_execute_itype_program(program):
+    with machinestate.restored_machine(m):
+        result = programs.execute_program(m, program)
+        assert result.succeeded
+        assert len(result.statuses) == len(program)
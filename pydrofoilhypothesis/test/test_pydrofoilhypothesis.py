@@ -2,7 +2,7 @@ import pytest
 from pydrofoilhypothesis import pydrofoilhypothesis
 import _pydrofoil
 
-from hypothesis import given, strategies as st, example
+from hypothesis import given, find, strategies as st, example
 
 m = _pydrofoil.RISCV64()
 typ = m.lowlevel.bit_str.sail_type.arguments[0]
@@ -40,6 +40,14 @@ bigBitvetor_strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(
 def test_BigBitvetor(val):
     assert isinstance(val, _pydrofoil.bitvector)
     assert len(val) >= 32
+    assert len(val) == bigBitvetortyp.width
+    assert 0 <= val.unsigned() < 2 ** len(val)
+
+
+def test_BigBitvetor_default():
+    val = pydrofoilhypothesis.default_value(bigBitvetortyp, m)
+    assert len(val) == bigBitvetortyp.width
+    assert val.unsigned() == 0
 
 
 typ = m.lowlevel.bool_bit_backwards.sail_type.result
@@ -330,3 +338,156 @@ def test_smoke_more(data):
     typ = data.draw(st.sampled_from(sailtyps))
     value = data.draw(pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, m))
     pydrofoilhypothesis.default_value(typ, m)
+
+
+def test_strategy_cache():
+    typ = m.types.ast.sail_type
+    strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, m)
+    assert pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, m) is strategy
+    pst = pydrofoilhypothesis.BasePydrofoilStrategies(m)
+    assert pst.hypothesis_from_pydrofoil_type(typ) is pst.hypothesis_from_pydrofoil_type(
+        typ
+    )
+    assert pst.hypothesis_from_pydrofoil_type(typ) is not strategy
+
+
+def test_sailtype_kind():
+    registers = dict(m.register_info())
+    assert pydrofoilhypothesis.sailtype_kind(registers["mhpmevent"]) == "FVec"
+    assert pydrofoilhypothesis.sailtype_kind(registers["x1"]) == "SmallFixedBitVector"
+    assert pydrofoilhypothesis.sailtype_kind(m.lowlevel.wX.sail_type.result) == "Unit"
+    assert pydrofoilhypothesis.sailtype_kind(vectyp) == "Vec"
+    assert pydrofoilhypothesis.sailtype_kind(m.types.ast.sail_type) == "Union"
+
+
+@pytest.fixture
+def sailtype_kinds(monkeypatch):
+    """Undoes the register_sailtype_kind calls of a test at teardown."""
+    for name in ("_sailtype_kinds", "_strategy_builders", "_default_builders"):
+        monkeypatch.setattr(
+            pydrofoilhypothesis, name, dict(getattr(pydrofoilhypothesis, name))
+        )
+
+
+class RangeType:
+    def __init__(self, low, high):
+        self.low = low
+        self.high = high
+
+
+def test_registered_sailtype_kind(sailtype_kinds):
+    pydrofoilhypothesis.register_sailtype_kind(
+        RangeType,
+        "Range",
+        strategy=lambda strategies, typ: st.integers(typ.low, typ.high),
+        default=lambda typ, machine: typ.low,
+    )
+    rangetyp = RangeType(3, 7)
+
+    @given(pydrofoilhypothesis.hypothesis_from_pydrofoil_type(rangetyp, m))
+    def draw_range(val):
+        assert 3 <= val <= 7
+
+    draw_range()
+    assert pydrofoilhypothesis.default_value(rangetyp, m) == 3
+
+
+def test_register_plan():
+    plan = pydrofoilhypothesis.register_plan(
+        m, include_registers, always_default_registers
+    )
+    assert plan is pydrofoilhypothesis.register_plan(
+        m, list(reversed(include_registers)), always_default_registers
+    )
+    assert plan.random_registers == set(include_registers) - set(
+        always_default_registers
+    )
+    assert not set(plan.optional_registers) & set(always_default_registers)
+    assert not set(plan.optional_registers) & set(include_registers)
+    assert plan.default_value("mhpmevent") == plan.default_value("mhpmevent")
+    assert plan.default_value("mhpmevent") is not plan.default_value("mhpmevent")
+
+
+def test_random_register_values_include_is_random():
+    strategy = pydrofoilhypothesis.random_register_values(m, ["x1"], [])
+    values = find(strategy, lambda values: values["x1"].unsigned() != 0)
+    assert values["x1"].unsigned() != 0
+
+
+all_registers = [name for (name, typ) in m.register_info()]
+
+
+@given(pydrofoilhypothesis.random_register_values(m, ["x1"], all_registers[1:]))
+def test_random_register_values_no_optional_registers(values):
+    assert len(values) == len(m.register_info())
+
+
+class CountingStrategies(pydrofoilhypothesis.BasePydrofoilStrategies):
+    def __init__(self, machine):
+        super().__init__(machine)
+        self.built = []
+
+    def _build_strategy(self, typ):
+        self.built.append(typ)
+        return super()._build_strategy(typ)
+
+
+def test_union_constructors_are_built_lazily():
+    pst = CountingStrategies(m)
+    strategy = pst.hypothesis_from_pydrofoil_type(m.types.ast.sail_type)
+    assert pst.built == [m.types.ast.sail_type]
+    value = find(strategy, lambda value: True)
+    assert isinstance(value, m.types.ast)
+    assert len(pst.built) > 1
+
+
+def test_constructor_builder():
+    itype = dict(m.types.ast.sail_type.constructors)["ITYPE"]
+    builder = pydrofoilhypothesis.constructor_builder(m, "ITYPE", itype)
+    assert builder is pydrofoilhypothesis.constructor_builder(m, "ITYPE", itype)
+    value = builder(pydrofoilhypothesis.default_value(itype, m))
+    assert isinstance(value, m.types.ITYPE)
+
+
+def test_default_value_is_cached():
+    registers = dict(m.register_info())
+    x1_default = pydrofoilhypothesis.default_value(registers["x1"], m)
+    assert pydrofoilhypothesis.default_value(registers["x1"], m) is x1_default
+    fvec_default = pydrofoilhypothesis.default_value(registers["mhpmevent"], m)
+    fvec_default2 = pydrofoilhypothesis.default_value(registers["mhpmevent"], m)
+    assert fvec_default == fvec_default2
+    assert fvec_default is not fvec_default2
+    fvec_default.append(None)
+    assert len(pydrofoilhypothesis.default_value(registers["mhpmevent"], m)) == 32
+    assert (
+        pydrofoilhypothesis.register_default_value(m, "mhpmevent") == fvec_default2
+    )
+
+
+class TupleType(tuple):
+    pass
+
+
+def test_default_value_nested_lists_are_copied(sailtype_kinds):
+    pydrofoilhypothesis.register_sailtype_kind(TupleType, "Tuple")
+    vectyp = m.lowlevel.write_vmask.sail_type.arguments[2]
+    x1typ = dict(m.register_info())["x1"]
+    tupletyp = TupleType([vectyp, x1typ])
+    default = pydrofoilhypothesis.default_value(tupletyp, m)
+    length = len(default[0])
+    default[0].append(None)
+    assert len(pydrofoilhypothesis.default_value(tupletyp, m)[0]) == length
+    nested = TupleType([tupletyp, x1typ])
+    pydrofoilhypothesis.default_value(nested, m)[0][0].append(None)
+    assert len(pydrofoilhypothesis.default_value(nested, m)[0][0]) == length
+
+
+def test_clear_machine_cache():
+    machine = _pydrofoil.RISCV64()
+    strategies = pydrofoilhypothesis.strategies_for_machine(machine)
+    assert pydrofoilhypothesis.strategies_for_machine(machine) is strategies
+    pydrofoilhypothesis.clear_machine_cache(machine)
+    assert id(machine) not in pydrofoilhypothesis._machine_caches
+    assert pydrofoilhypothesis.strategies_for_machine(machine) is not strategies
+    pydrofoilhypothesis.clear_machine_cache(machine)
+    pydrofoilhypothesis.clear_machine_cache(machine)
@@ -0,0 +1,97 @@
+import itertools
+
+import pytest
+from pydrofoilhypothesis import machinestate, pydrofoilhypothesis, streaming
+import _pydrofoil
+
+from hypothesis import strategies as st
+
+m = _pydrofoil.RISCV64()
+asttyp = m.types.ast.sail_type
+
+
+def test_generate_ast():
+    for value in streaming.generate_values(asttyp, m, seed=1, count=200):
+        assert isinstance(value, m.types.ast)
+
+
+def test_same_seed_same_values():
+    registers = dict(m.register_info())
+    for typ in (registers["x1"], registers["mhpmevent"], asttyp):
+        values1 = list(streaming.generate_values(typ, m, seed=42, count=20))
+        values2 = list(streaming.generate_values(typ, m, seed=42, count=20))
+        assert values1 == values2
+
+
+def test_generate_is_lazy():
+    values = streaming.generate_values(dict(m.register_info())["x1"], m, seed=0)
+    for value in itertools.islice(values, 1000):
+        assert len(value) == 64
+
+
+def test_all_register_types():
+    generator = streaming.StreamingGenerator(m, seed=3)
+    for name, typ in m.register_info():
+        for value in generator.generate(typ, count=3):
+            default = pydrofoilhypothesis.default_value(typ, m)
+            assert value.__class__ == default.__class__
+
+
+class PydrofoilStrategies(pydrofoilhypothesis.BasePydrofoilStrategies):
+    def gen_bool(self, draw):
+        return True
+
+    def gen_Vec(self, draw, strategy):
+        return draw(st.lists(strategy, min_size=1, max_size=3))
+
+    def union_PTW_Result(self, draw, typ):
+        return "PTW_Result"
+
+
+def test_customization_hooks_are_used():
+    generator = streaming.StreamingGenerator(PydrofoilStrategies(m), seed=0)
+    structtyp = m.lowlevel.encdec_mul_op_backwards.sail_type.result
+    for value in generator.generate(structtyp, count=10):
+        assert value.high is True
+        assert value.signed_rs1 is True
+    vectyp = m.lowlevel.write_vmask.sail_type.arguments[2]
+    for value in generator.generate(vectyp, count=10):
+        assert 1 <= len(value) <= 3
+        assert all(element is True for element in value)
+    for value in generator.generate(m.types.PTW_Result.sail_type, count=3):
+        assert value == "PTW_Result"
+
+
+def test_generate_register_values():
+    include_registers = ["x1"]
+    always_default_registers = ["x2"]
+    generator = streaming.StreamingGenerator(m, seed=0)
+    for values in generator.generate_register_values(
+        include_registers, always_default_registers, count=20
+    ):
+        assert len(values) == len(m.register_info())
+        assert values["x2"] == pydrofoilhypothesis.register_default_value(m, "x2")
+        with machinestate.restored_machine(m):
+            for name, value in values.items():
+                # same registers as in test_examples
+                if ("tlb" not in name) and ("cur_privilege" not in name) and ("x" not in name):
+                    m.write_register(name, value)
+
+
+class FilteringStrategies(pydrofoilhypothesis.BasePydrofoilStrategies):
+    def gen_bool(self, draw):
+        return draw(st.integers(0, 7).filter(lambda value: value < 2)) == 1
+
+
+class RejectingStrategies(pydrofoilhypothesis.BasePydrofoilStrategies):
+    def gen_bool(self, draw):
+        return draw(st.integers(0, 7).filter(lambda value: value > 7)) == 1
+
+
+def test_rejected_draws_are_retried():
+    booltyp = m.lowlevel.bool_bit_backwards.sail_type.result
+    generator = streaming.StreamingGenerator(FilteringStrategies(m), seed=0)
+    assert set(generator.generate(booltyp, count=50)) == {False, True}
+    generator = streaming.StreamingGenerator(RejectingStrategies(m), seed=0)
+    with pytest.raises(streaming.RejectedDrawError):
+        next(generator.generate(booltyp))
@@ -0,0 +1,64 @@
+import pytest
+from pydrofoilhypothesis import machinestate, pydrofoilhypothesis, tracing
+import _pydrofoil
+
+from hypothesis import given, settings
+
+m = _pydrofoil.RISCV64()
+x_registers = [f"x{i}" for i in range(1, 32)]
+tracer = tracing.RegisterReadTracer(m, x_registers + ["mhpmevent"])
+
+
+def test_trace_itype():
+    addi = m.types.ITYPE(
+        _pydrofoil.bitvector(12, 1),
+        _pydrofoil.bitvector(5, 5),
+        _pydrofoil.bitvector(5, 6),
+        "RISCV_ADDI",
+    )
+    reads = tracer.trace(addi)
+    assert "x5" in reads
+    assert "x6" not in reads
+    assert "x7" not in reads
+    assert "mhpmevent" not in reads
+    assert machinestate.initial_snapshot(m).dirty_registers() == []
+
+
+def test_trace_reads_hidden_by_zero_operand():
+    mul_typ = dict(m.types.ast.sail_type.constructors)["MUL"]
+    mul_op = pydrofoilhypothesis.default_value(list(mul_typ)[3], m)
+    rs2, rs1, rd = [_pydrofoil.bitvector(5, index) for index in (3, 2, 1)]
+    mul = pydrofoilhypothesis.constructor_builder(m, "MUL", mul_typ)((rs2, rs1, rd, mul_op))
+    reads = tracer.trace(mul)
+    assert {"x2", "x3"} <= reads
+    assert "x1" not in reads
+
+
+def test_read_set_contains_whole_register_file():
+    reads = tracer.read_set("ITYPE")
+    assert reads == set(x_registers)
+    assert tracer.read_set("ITYPE") is reads
+
+
+@settings(max_examples=20)
+@given(tracing.traced_register_values(tracer, "ITYPE"))
+def test_traced_register_values(values):
+    assert len(values) == len(m.register_info())
+    reads = tracer.read_set("ITYPE")
+    for name, value in values.items():
+        if name not in reads:
+            assert value == pydrofoilhypothesis.register_default_value(m, name)
+
+
+itype_typ = dict(m.types.ast.sail_type.constructors)["ITYPE"]
+itype_instructions = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(
+    itype_typ, m
+).map(lambda args: m.types.ITYPE(*args))
+
+
+@settings(max_examples=10)
+@given(tracing.instructions_with_register_values(tracer, itype_instructions))
+def test_instructions_with_register_values(instruction_and_values):
+    instruction, values = instruction_and_values
+    assert isinstance(instruction, m.types.ITYPE)
+    assert len(values) == len(m.register_info())
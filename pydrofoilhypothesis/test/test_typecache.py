@@ -0,0 +1,72 @@
+import json
+import os
+
+import pytest
+from pydrofoilhypothesis import machinestate, pydrofoilhypothesis, typecache
+import _pydrofoil
+
+from hypothesis import given, settings, strategies as st
+
+m = _pydrofoil.RISCV64()
+
+
+@pytest.fixture
+def types(tmp_path):
+    return typecache.MachineTypes(typecache.load_description(m, str(tmp_path)))
+
+
+def test_cache_file_is_reused(tmp_path, monkeypatch):
+    description = typecache.load_description(m, str(tmp_path))
+    [filename] = os.listdir(tmp_path)
+    assert typecache.build_hash(m) in filename
+    with open(tmp_path / filename) as f:
+        assert json.load(f) == description
+
+    def fail(machine):
+        assert False, "machine described again"
+
+    monkeypatch.setattr(typecache, "describe_machine", fail)
+    assert typecache.load_description(m, str(tmp_path)) == description
+
+
+def test_stale_cache_file_is_replaced(tmp_path):
+    description = typecache.load_description(m, str(tmp_path))
+    [filename] = os.listdir(tmp_path)
+    with open(tmp_path / filename, "w") as f:
+        json.dump(dict(description, version=-1), f)
+    assert typecache.load_description(m, str(tmp_path)) == description
+
+
+def test_register_info(types):
+    assert types.register_names() == [name for (name, typ) in m.register_info()]
+    for (name, typ), (realname, realtyp) in zip(types.register_info(), m.register_info()):
+        assert name == realname
+        assert pydrofoilhypothesis.sailtype_kind(typ) == pydrofoilhypothesis.sailtype_kind(realtyp)
+        assert pydrofoilhypothesis.default_value(typ, m) == pydrofoilhypothesis.default_value(realtyp, m)
+    assert types.register_type("x1") is types.register_type("x1")
+
+
+def test_function_and_named_types(types):
+    execute = types.function_type("execute")
+    assert pydrofoilhypothesis.sailtype_kind(execute.arguments[0]) == "Union"
+    assert execute.arguments[0] is types.named_type("ast")
+    assert [name for (name, typ) in types.named_type("ast").constructors] == [
+        name for (name, typ) in m.types.ast.sail_type.constructors
+    ]
+
+
+@settings(max_examples=20)
+@given(data=st.data())
+def test_strategies_from_descriptions(tmp_path_factory, data):
+    types = typecache.machine_types(m, str(tmp_path_factory.getbasetemp()))
+    with machinestate.restored_machine(m):
+        for name, typ in types.register_info():
+            # same registers as in test_examples
+            if ("tlb" in name) or ("cur_privilege" in name) or ("x" in name):
+                continue
+            strategy = pydrofoilhypothesis.hypothesis_from_pydrofoil_type(typ, m)
+            m.write_register(name, data.draw(strategy))
+    instruction = data.draw(
+        pydrofoilhypothesis.hypothesis_from_pydrofoil_type(types.named_type("ast"), m)
+    )
+    assert isinstance(instruction, m.types.ast)
@@ -0,0 +1,192 @@
+import _pydrofoil
+from hypothesis import strategies as st
+from hypothesis.strategies import DrawFn
+
+from pydrofoilhypothesis import machinestate, streaming
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    constructor_builder,
+    hypothesis_from_pydrofoil_type,
+    random_register_values,
+)
+
+
+# prefixes of the register files: an instruction that reads one register of
+# a file reads others depending on its register-index fields
+REGISTER_FILE_PREFIXES = ("x", "f")
+
+
+class RegisterReadTracer:
+    """Finds out which registers the execution of an instruction reads.
+
+    pydrofoil has no hook that reports register reads during execute, so the
+    read set is inferred. The instruction is executed once from the initial
+    snapshot of the machine with random values in the register files (x1,
+    x2, ..., f0, f1, ...), so that no read is hidden by a zero operand. Then
+    it is executed once more for every candidate register, with that register
+    set to a different value. A register is read if changing it changes the
+    result of execute or the final value of any other register, or if its
+    own final value is neither the perturbed value nor the value the
+    instruction writes to it in the first run.
+
+    Read sets are cached per union constructor (e.g. "ITYPE"), joined over a
+    few sample instructions of the constructor. Which registers of a file an
+    instruction reads depends on its register-index fields, so if the
+    samples read any register of a file, the read set contains the whole
+    file.
+    """
+
+    def __init__(
+        self,
+        machine: _pydrofoil.RISCV64,
+        candidate_registers: list = None,
+        samples: int = 4,
+        seed: int = 0,
+        register_file_prefixes: tuple = REGISTER_FILE_PREFIXES,
+    ):
+        """Initialize the tracer.
+
+        Args:
+            machine: The machine to execute on. It is reset to its initial snapshot before every run.
+            candidate_registers (list[str]): Registers that may be read, defaults to all registers.
+            samples (int): Number of sample instructions traced per constructor.
+            seed: Seed for the sample instructions and the random register values.
+            register_file_prefixes (tuple[str]): Prefixes of the register files, the
+                registers of a file are named prefix followed by a number.
+        """
+        self.machine = machine
+        self.snapshot = machinestate.initial_snapshot(machine)
+        if candidate_registers is None:
+            candidate_registers = self.snapshot.names
+        self.candidate_registers = list(candidate_registers)
+        self.samples = samples
+        self._generator = streaming.StreamingGenerator(machine, seed)
+        self._register_types = dict(machine.register_info())
+        self.register_files = _register_files(
+            self.candidate_registers, register_file_prefixes
+        )
+        # constructor name -> frozenset of register names
+        self._read_sets = {}
+
+    def trace(self, instruction) -> frozenset:
+        """Returns the names of the registers read when executing instruction."""
+        background = {}
+        for registers in self.register_files:
+            for name in registers:
+                value = self._random_value(name, self.snapshot.values[name])
+                if value is not None:
+                    background[name] = value
+        baseline_result, baseline_state = self._run(instruction, background)
+        reads = set()
+        for name in self.candidate_registers:
+            old_value = background.get(name, self.snapshot.values[name])
+            value = self._random_value(name, old_value)
+            if value is None:
+                continue
+            values = dict(background)
+            values[name] = value
+            result, state = self._run(instruction, values)
+            if result != baseline_result:
+                reads.add(name)
+                continue
+            final_value = state.pop(name)
+            baseline_final_value = baseline_state[name]
+            if final_value != value and final_value != baseline_final_value:
+                reads.add(name)
+                continue
+            if any(state[other] != baseline_state[other] for other in state):
+                reads.add(name)
+        return frozenset(reads)
+
+    def read_set(self, constructor: str, typ=None) -> frozenset:
+        """Returns the registers read by instructions of the given union constructor.
+
+        Args:
+            constructor (str): Name of the constructor, e.g. "ITYPE".
+            typ: The union type the constructor belongs to, defaults to ast.
+        """
+        try:
+            return self._read_sets[constructor]
+        except KeyError:
+            pass
+        if typ is None:
+            typ = self.machine.types.ast.sail_type
+        constructor_typ = dict(typ.constructors)[constructor]
+        builder = constructor_builder(self.machine, constructor, constructor_typ)
+        reads = set()
+        for value in self._generator.generate(constructor_typ, self.samples):
+            reads.update(self.trace(builder(value)))
+        for registers in self.register_files:
+            if not reads.isdisjoint(registers):
+                reads.update(registers)
+        read_set = self._read_sets[constructor] = frozenset(reads)
+        return read_set
+
+    def instruction_read_set(self, instruction) -> frozenset:
+        """Returns the read set of the constructor of instruction, see read_set."""
+        return self.read_set(instruction.__class__.__name__)
+
+    def _random_value(self, name: str, old_value):
+        """Returns a random value for the register that differs from old_value, or None."""
+        for value in self._generator.generate(self._register_types[name], 8):
+            if value != old_value:
+                return value
+        return None
+
+    def _run(self, instruction, values: dict) -> tuple:
+        """Executes instruction from the initial snapshot with values written, returns (result, final registers)."""
+        self.snapshot.restore()
+        machinestate.apply_register_values(self.machine, values, self.snapshot.values)
+        try:
+            result = self.machine.lowlevel.execute(instruction)
+        except Exception as e:
+            result = ("exception", e.__class__.__name__)
+        state = machinestate.read_register_values(self.machine)
+        self.snapshot.restore()
+        return result, state
+
+
+def _register_files(names: list, prefixes: tuple) -> list:
+    """Returns a list of register files, the names in names that are a prefix followed by a number."""
+    files = []
+    for prefix in prefixes:
+        registers = frozenset(
+            name
+            for name in names
+            if name.startswith(prefix) and name[len(prefix):].isdigit()
+        )
+        if registers:
+            files.append(registers)
+    return files
+
+
+def traced_register_values(tracer: RegisterReadTracer, constructor: str):
+    """Hypothesis strategy for register values of instructions of the given constructor.
+
+    Only the registers the constructor's instructions read get random values,
+    all other registers are set to their default values.
+    """
+    reads = tracer.read_set(constructor)
+    others = [name for name in tracer.snapshot.names if name not in reads]
+    return random_register_values(tracer.machine, reads, others)
+
+
+@st.composite
+def instructions_with_register_values(
+    draw: DrawFn, tracer: RegisterReadTracer, instructions=None
+) -> tuple:
+    """Hypothesis strategy generating (instruction, register values) pairs.
+
+    The register values randomize only the registers read by the
+    instruction's constructor, see traced_register_values.
+
+    Args:
+        tracer: The RegisterReadTracer of the machine.
+        instructions: Strategy for the instructions, defaults to all ast values.
+    """
+    if instructions is None:
+        instructions = hypothesis_from_pydrofoil_type(
+            tracer.machine.types.ast.sail_type, tracer.machine
+        )
+    instruction = draw(instructions)
+    values = draw(traced_register_values(tracer, instruction.__class__.__name__))
+    return instruction, values
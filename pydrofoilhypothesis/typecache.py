@@ -0,0 +1,351 @@
+"""On-disk cache of the type metadata of pydrofoil machines.
+
+Walking register_info(), m.types and the sail types of all m.lowlevel
+functions is slow. describe_machine() turns them into a JSON description
+once per pydrofoil build, and MachineTypes builds light-weight type objects
+from that description on demand. The type objects are registered with
+register_sailtype_kind, so hypothesis_from_pydrofoil_type and default_value
+accept them like the types of the machine itself.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+import _pydrofoil
+
+from pydrofoilhypothesis.pydrofoilhypothesis import (
+    _machine_cache,
+    register_sailtype_kind,
+    sailtype_kind,
+)
+
+FORMAT_VERSION = 1
+
+# kinds whose description is just [kind]
+_simple_kinds = (
+    "Bool",
+    "MachineInt",
+    "Int",
+    "String",
+    "Unit",
+    "GenericBitVector",
+)
+
+
+def _describe_type(typ, description: dict) -> list:
+    """Returns the JSON description of typ, adds enums, structs and unions to the tables of description."""
+    kind = sailtype_kind(typ)
+    if kind in ("SmallFixedBitVector", "BigFixedBitVector"):
+        return [kind, typ.width]
+    if kind == "FVec":
+        return [kind, typ.length, _describe_type(typ.of, description)]
+    if kind == "Vec":
+        return [kind, _describe_type(typ.of, description)]
+    if kind == "Tuple":
+        return [kind, [_describe_type(elementtyp, description) for elementtyp in typ]]
+    if kind == "Enum":
+        description["enums"][typ.name] = list(typ.elements)
+        return [kind, typ.name]
+    if kind == "Struct":
+        structs = description["structs"]
+        if typ.name not in structs:
+            structs[typ.name] = None  # recursive types
+            structs[typ.name] = [
+                [name, _describe_type(fieldtyp, description)]
+                for (name, fieldtyp) in typ.fields
+            ]
+        return [kind, typ.name]
+    if kind == "Union":
+        unions = description["unions"]
+        if typ.name not in unions:
+            unions[typ.name] = None  # recursive types
+            unions[typ.name] = [
+                [name, _describe_type(constructortyp, description)]
+                for (name, constructortyp) in typ.constructors
+            ]
+        return [kind, typ.name]
+    assert kind in _simple_kinds, f"can not describe types of kind {kind}"
+    return [kind]
+
+
+def describe_machine(machine: _pydrofoil.RISCV64) -> dict:
+    """Returns a JSON-serializable description of the registers, types and lowlevel functions of machine."""
+    description = {
+        "version": FORMAT_VERSION,
+        "build": build_hash(machine),
+        "enums": {},
+        "structs": {},
+        "unions": {},
+        "registers": [],
+        "types": {},
+        "functions": {},
+    }
+    for name, typ in machine.register_info():
+        description["registers"].append([name, _describe_type(typ, description)])
+    for name in dir(machine.types):
+        typ = getattr(getattr(machine.types, name), "sail_type", None)
+        if typ is None or getattr(typ, "name", None) != name:
+            continue
+        description["types"][name] = _describe_type(typ, description)
+    for name in dir(machine.lowlevel):
+        typ = getattr(getattr(machine.lowlevel, name), "sail_type", None)
+        if typ is None:
+            continue
+        try:
+            description["functions"][name] = [
+                [_describe_type(argtyp, description) for argtyp in typ.arguments],
+                _describe_type(typ.result, description),
+            ]
+        except AssertionError:
+            # types of a kind pydrofoilhypothesis does not support
+            continue
+    return description
+
+
+def build_hash(machine: _pydrofoil.RISCV64) -> str:
+    """Returns a key that changes whenever pydrofoil is rebuilt.
+
+    It is computed from the path, size and modification time of the file
+    that contains the machine's module (or of the interpreter, if pydrofoil
+    is built into it).
+    """
+    cls = machine.__class__
+    module = sys.modules.get(cls.__module__)
+    path = getattr(module, "__file__", None) or sys.executable
+    stat = os.stat(path)
+    key = f"{FORMAT_VERSION}:{cls.__module__}.{cls.__qualname__}:{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:20]
+
+
+def default_cache_dir() -> str:
+    """Returns $PYDROFOILHYPOTHESIS_CACHE_DIR, or ~/.cache/pydrofoilhypothesis."""
+    cache_dir = os.environ.get("PYDROFOILHYPOTHESIS_CACHE_DIR")
+    if cache_dir:
+        return cache_dir
+    return os.path.join(os.path.expanduser("~"), ".cache", "pydrofoilhypothesis")
+
+
+def load_description(machine: _pydrofoil.RISCV64, cache_dir: str = None) -> dict:
+    """Returns the description of machine, from the cache if the build has been described before.
+
+    The cache file is written atomically, so that concurrent test processes
+    (e.g. pytest-xdist workers) can share a cache directory. Failures to
+    read or write the cache fall back to describing the machine.
+    """
+    if cache_dir is None:
+        cache_dir = default_cache_dir()
+    key = build_hash(machine)
+    path = os.path.join(cache_dir, f"{machine.__class__.__name__}-{key}.json")
+    try:
+        with open(path) as f:
+            description = json.load(f)
+    except (OSError, ValueError):
+        pass
+    else:
+        if description.get("version") == FORMAT_VERSION and description.get("build") == key:
+            return description
+    description = describe_machine(machine)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmppath = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump(description, f)
+        os.replace(tmppath, path)
+    except OSError:
+        pass
+    return description
+
+
+class DescribedType:
+    """A pydrofoil type built from a description, see MachineTypes."""
+
+    def __init__(self, types: "MachineTypes", description: list):
+        self._types = types
+        self._description = description
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self._description!r}>"
+
+
+class _DescribedBitVector(DescribedType):
+    @property
+    def width(self) -> int:
+        return self._description[1]
+
+
+class _DescribedFVec(DescribedType):
+    @property
+    def length(self) -> int:
+        return self._description[1]
+
+    @property
+    def of(self):
+        return self._types.type(self._description[2])
+
+
+class _DescribedVec(DescribedType):
+    @property
+    def of(self):
+        return self._types.type(self._description[1])
+
+
+class _DescribedTuple(DescribedType):
+    def __init__(self, types: "MachineTypes", description: list):
+        DescribedType.__init__(self, types, description)
+        self._elements = None
+
+    def _element_types(self) -> list:
+        if self._elements is None:
+            self._elements = [self._types.type(element) for element in self._description[1]]
+        return self._elements
+
+    def __iter__(self):
+        return iter(self._element_types())
+
+    def __len__(self) -> int:
+        return len(self._description[1])
+
+    def __getitem__(self, index):
+        return self._element_types()[index]
+
+
+class _DescribedEnum(DescribedType):
+    @property
+    def name(self) -> str:
+        return self._description[1]
+
+    @property
+    def elements(self) -> list:
+        return self._types.description["enums"][self.name]
+
+
+class _DescribedStruct(DescribedType):
+    def __init__(self, types: "MachineTypes", description: list):
+        DescribedType.__init__(self, types, description)
+        self._fields = None
+
+    @property
+    def name(self) -> str:
+        return self._description[1]
+
+    @property
+    def fields(self) -> list:
+        if self._fields is None:
+            self._fields = [
+                (name, self._types.type(fieldtyp))
+                for (name, fieldtyp) in self._types.description["structs"][self.name]
+            ]
+        return self._fields
+
+
+class _DescribedUnion(DescribedType):
+    def __init__(self, types: "MachineTypes", description: list):
+        DescribedType.__init__(self, types, description)
+        self._constructors = None
+
+    @property
+    def name(self) -> str:
+        return self._description[1]
+
+    @property
+    def constructors(self) -> list:
+        if self._constructors is None:
+            self._constructors = [
+                (name, self._types.type(constructortyp))
+                for (name, constructortyp) in self._types.description["unions"][self.name]
+            ]
+        return self._constructors
+
+
+class DescribedFunction:
+    """The type of a lowlevel function built from a description, with arguments and result like sailtypes.Function."""
+
+    def __init__(self, types: "MachineTypes", description: list):
+        self.arguments = [types.type(argtyp) for argtyp in description[0]]
+        self.result = types.type(description[1])
+
+
+_described_classes = {
+    "SmallFixedBitVector": type("_DescribedSmallFixedBitVector", (_DescribedBitVector,), {}),
+    "BigFixedBitVector": type("_DescribedBigFixedBitVector", (_DescribedBitVector,), {}),
+    "FVec": _DescribedFVec,
+    "Vec": _DescribedVec,
+    "Tuple": _DescribedTuple,
+    "Enum": _DescribedEnum,
+    "Struct": _DescribedStruct,
+    "Union": _DescribedUnion,
+}
+for _kind in _simple_kinds:
+    _described_classes[_kind] = type(f"_Described{_kind}", (DescribedType,), {})
+for _kind, _cls in _described_classes.items():
+    register_sailtype_kind(_cls, _kind)
+
+
+def _freeze(description):
+    """Returns a hashable version of a (nested list) type description."""
+    if isinstance(description, list):
+        return tuple(_freeze(item) for item in description)
+    return description
+
+
+class MachineTypes:
+    """The types of a machine, built lazily from its description.
+
+    Every type is built once, so the strategy caches of pydrofoilhypothesis
+    work for them like for the machine's own types.
+    """
+
+    def __init__(self, description: dict):
+        self.description = description
+        self._types = {}
+        self._functions = {}
+        self._register_types = dict(description["registers"])
+
+    def type(self, description: list) -> DescribedType:
+        """Returns the type object of a type description."""
+        key = _freeze(description)
+        try:
+            return self._types[key]
+        except KeyError:
+            typ = self._types[key] = _described_classes[description[0]](self, description)
+            return typ
+
+    def register_info(self) -> list:
+        """Returns a list of (name, type) pairs like machine.register_info()."""
+        return [(name, self.type(typ)) for (name, typ) in self.description["registers"]]
+
+    def register_names(self) -> list:
+        """Returns the names of all registers, without building their types."""
+        return [name for (name, typ) in self.description["registers"]]
+
+    def register_type(self, name: str) -> DescribedType:
+        """Returns the type of the register with the given name."""
+        return self.type(self._register_types[name])
+
+    def named_type(self, name: str) -> DescribedType:
+        """Returns the type called name, like machine.types.<name>.sail_type."""
+        return self.type(self.description["types"][name])
+
+    def function_type(self, name: str) -> DescribedFunction:
+        """Returns the type of the lowlevel function called name, like machine.lowlevel.<name>.sail_type."""
+        try:
+            return self._functions[name]
+        except KeyError:
+            function = self._functions[name] = DescribedFunction(
+                self, self.description["functions"][name]
+            )
+            return function
+
+
+def machine_types(machine: _pydrofoil.RISCV64, cache_dir: str = None) -> MachineTypes:
+    """Returns the (cached) MachineTypes of machine, see load_description."""
+    cache = _machine_cache(machine)
+    types = cache.get("machine_types")
+    if types is None:
+        types = cache["machine_types"] = MachineTypes(
+            load_description(machine, cache_dir)
+        )
+    return types